@@ -6,15 +6,34 @@ import time
 import json
 import sys
 import random
+import gzip
+import hashlib
+import io
+import zlib
+import math
+import heapq
+import contextlib
+import contextvars
+import functools
+import multiprocessing
+import sqlite3
+import threading
+import concurrent.futures
+import queue
 from datetime import datetime, timedelta
-from typing import Dict, List, Set, Optional, Any, Tuple
-from enum import Enum
+from typing import Dict, List, Set, Optional, Any, Tuple, AsyncIterator, Callable
+from enum import Enum, IntEnum
 import psutil
 import aiohttp
-from collections import defaultdict
+from collections import defaultdict, deque, OrderedDict, Counter, namedtuple
+
+try:
+    import orjson  # اختياري: فك JSON أسرع في Webhook
+except ImportError:
+    orjson = None
 
 from fastapi import FastAPI, Request, Response, HTTPException
-from aiogram import Bot, Dispatcher, types, F
+from aiogram import Bot, Dispatcher, types, F, __version__ as aiogram_version
 from aiogram.types import (
     InlineKeyboardMarkup, 
     InlineKeyboardButton, 
@@ -22,17 +41,23 @@ from aiogram.types import (
     KeyboardButton,
     CallbackQuery,
     Message,
-    FSInputFile
+    FSInputFile,
+    BufferedInputFile
 )
 from aiogram.client.default import DefaultBotProperties
 from aiogram.enums import ParseMode, ChatAction
 from aiogram.filters import Command, CommandStart, CommandObject
+from aiogram.filters.callback_data import CallbackData
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
-from aiogram.fsm.storage.memory import MemoryStorage
+from aiogram.fsm.storage.base import BaseStorage, StorageKey, StateType, DefaultKeyBuilder
 from aiogram.utils.keyboard import InlineKeyboardBuilder, ReplyKeyboardBuilder
 from aiogram.utils.markdown import hbold, hlink, hcode
-from aiogram.methods import GetChatAdministrators
+from aiogram.methods import GetChatAdministrators, GetUpdates
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer, PRODUCTION
+from aiogram.exceptions import TelegramRetryAfter, TelegramForbiddenError, TelegramBadRequest
 
 # ================== الإعدادات المتقدمة ==================
 TOKEN = os.getenv("TOKEN", "")
@@ -56,9 +81,176 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# ================== جلسة HTTP ==================
+HTTP_POOL_LIMIT = int(os.getenv("HTTP_POOL_LIMIT", 100))  # إجمالي الاتصالات المتزامنة
+HTTP_POOL_LIMIT_PER_HOST = int(os.getenv("HTTP_POOL_LIMIT_PER_HOST", 0))  # 0 = بدون حد
+HTTP_KEEPALIVE_TIMEOUT = float(os.getenv("HTTP_KEEPALIVE_TIMEOUT", 60))  # 0 = إغلاق بعد كل طلب
+HTTP_DNS_TTL = int(os.getenv("HTTP_DNS_TTL", 3600))
+HTTP_DEFAULT_TIMEOUT = float(os.getenv("HTTP_DEFAULT_TIMEOUT", 30))
+TELEGRAM_API_BASE = os.getenv("TELEGRAM_API_BASE", "")  # خادم Bot API محلي (اختياري)
+
+# مهلات خاصة ببعض الطرق (ثوانٍ)
+HTTP_METHOD_TIMEOUTS = {
+    'sendDocument': 120,
+    'deleteMessage': 10,
+    'deleteMessages': 10,
+    'answerCallbackQuery': 5,
+    'getChatAdministrators': 15,
+    'getChatMember': 10,
+}
+
+class TunedAiohttpSession(AiohttpSession):
+    """جلسة aiohttp مشتركة بحدود اتصال وkeep-alive ومهلات لكل طريقة"""
+    
+    def __init__(self, limit: int = HTTP_POOL_LIMIT, limit_per_host: int = HTTP_POOL_LIMIT_PER_HOST,
+                 keepalive_timeout: float = HTTP_KEEPALIVE_TIMEOUT, dns_ttl: int = HTTP_DNS_TTL,
+                 timeout: float = HTTP_DEFAULT_TIMEOUT, api: TelegramAPIServer = PRODUCTION):
+        super().__init__(limit=limit, timeout=timeout, api=api)
+        self._connector_init.update(limit_per_host=limit_per_host, ttl_dns_cache=dns_ttl)
+        if keepalive_timeout > 0:
+            self._connector_init['keepalive_timeout'] = keepalive_timeout
+        else:
+            self._connector_init['force_close'] = True
+        self.connection_stats = {'created': 0, 'reused': 0}
+    
+    def _trace_config(self) -> aiohttp.TraceConfig:
+        trace = aiohttp.TraceConfig()
+        
+        async def on_create(session, context, params):
+            self.connection_stats['created'] += 1
+        
+        async def on_reuse(session, context, params):
+            self.connection_stats['reused'] += 1
+        
+        trace.on_connection_create_end.append(on_create)
+        trace.on_connection_reuseconn.append(on_reuse)
+        return trace
+    
+    async def create_session(self) -> aiohttp.ClientSession:
+        if self._should_reset_connector:
+            await self.close()
+        
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=self._connector_type(**self._connector_init),
+                headers={"User-Agent": f"{aiohttp.http.SERVER_SOFTWARE} aiogram/{aiogram_version}"},
+                trace_configs=[self._trace_config()],
+            )
+            self._should_reset_connector = False
+        
+        return self._session
+    
+    async def make_request(self, bot, method, timeout: Optional[int] = None):
+        if timeout is None:
+            timeout = HTTP_METHOD_TIMEOUTS.get(method.__api_method__)
+        return await super().make_request(bot, method, timeout=timeout)
+    
+    def pool_state(self) -> Dict[str, int]:
+        """عدد الاتصالات النشطة والخاملة في المجمع"""
+        connector = self._session.connector if self._session and not self._session.closed else None
+        if connector is None:
+            return {'active': 0, 'idle': 0}
+        return {
+            'active': len(getattr(connector, '_acquired', ())),
+            'idle': sum(len(conns) for conns in getattr(connector, '_conns', {}).values())
+        }
+
+# ================== تخزين حالات FSM ==================
+FSM_STORAGE_PATH = os.getenv("FSM_STORAGE_PATH", "fsm_states.sqlite3")
+FSM_STATE_TTL = int(os.getenv("FSM_STATE_TTL", 3600))  # حذف الحالات المتروكة بعد ساعة
+FSM_MAX_ENTRIES = int(os.getenv("FSM_MAX_ENTRIES", 10000))
+
+class SqliteStorage(BaseStorage):
+    """تخزين حالات FSM في SQLite مع انتهاء صلاحية، ويمكن مشاركته بين العمليات"""
+    
+    def __init__(self, path: str, ttl: int, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.key_builder = DefaultKeyBuilder()
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS fsm ("
+            "key TEXT PRIMARY KEY, state TEXT, data TEXT NOT NULL DEFAULT '{}', updated REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS fsm_updated ON fsm (updated)")
+        self._db.commit()
+    
+    def _execute(self, sql: str, params: Tuple = ()) -> List[Tuple]:
+        with self._lock:
+            rows = self._db.execute(sql, params).fetchall()
+            self._db.commit()
+            return rows
+    
+    def _delete(self, sql: str, params: Tuple = ()) -> int:
+        with self._lock:
+            count = self._db.execute(sql, params).rowcount
+            self._db.commit()
+            return count
+    
+    async def _run(self, sql: str, params: Tuple = ()) -> List[Tuple]:
+        return await asyncio.to_thread(self._execute, sql, params)
+    
+    async def _get(self, key: StorageKey) -> Optional[Tuple[Optional[str], str]]:
+        rows = await self._run(
+            "SELECT state, data FROM fsm WHERE key = ? AND updated >= ?",
+            (self.key_builder.build(key), time.time() - self.ttl)
+        )
+        return rows[0] if rows else None
+    
+    # الصف المنتهي يُعامل كغير موجود: الكتابة على أحد العمودين تمسح الآخر
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        value = state.state if isinstance(state, State) else state
+        await self._run(
+            "INSERT INTO fsm (key, state, updated) VALUES (?, ?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET state = excluded.state, updated = excluded.updated, "
+            "data = CASE WHEN fsm.updated < ? THEN '{}' ELSE fsm.data END",
+            (self.key_builder.build(key), value, time.time(), time.time() - self.ttl)
+        )
+    
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        row = await self._get(key)
+        return row[0] if row else None
+    
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        await self._run(
+            "INSERT INTO fsm (key, data, updated) VALUES (?, ?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET data = excluded.data, updated = excluded.updated, "
+            "state = CASE WHEN fsm.updated < ? THEN NULL ELSE fsm.state END",
+            (self.key_builder.build(key), json.dumps(data, ensure_ascii=False), time.time(), time.time() - self.ttl)
+        )
+    
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        row = await self._get(key)
+        return json.loads(row[1]) if row else {}
+    
+    async def purge(self) -> int:
+        """حذف الحالات المنتهية والزائدة عن الحد الأقصى"""
+        expired = await asyncio.to_thread(
+            self._delete, "DELETE FROM fsm WHERE updated < ?", (time.time() - self.ttl,))
+        overflow = await asyncio.to_thread(
+            self._delete,
+            "DELETE FROM fsm WHERE key IN (SELECT key FROM fsm ORDER BY updated DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,))
+        return expired + overflow
+    
+    async def count(self) -> int:
+        return (await self._run("SELECT COUNT(*) FROM fsm"))[0][0]
+    
+    async def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
 # التخزين
-storage = MemoryStorage()
-bot = Bot(token=TOKEN, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
+storage = SqliteStorage(FSM_STORAGE_PATH, FSM_STATE_TTL, FSM_MAX_ENTRIES)
+bot = Bot(
+    token=TOKEN,
+    session=TunedAiohttpSession(
+        api=TelegramAPIServer.from_base(TELEGRAM_API_BASE) if TELEGRAM_API_BASE else PRODUCTION
+    ),
+    default=DefaultBotProperties(parse_mode=ParseMode.HTML)
+)
 dp = Dispatcher(storage=storage)
 
 # قاعدة البيانات
@@ -102,6 +294,415 @@ class NotificationLevel(Enum):
     SUCCESS = "success"
     CRITICAL = "critical"
 
+# ================== مقاييس الأداء (Prometheus) ==================
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def format_metric_labels(names: Tuple[str, ...], values: Tuple, extra: str = "") -> str:
+    """تنسيق تسميات المقياس بصيغة Prometheus"""
+    parts = []
+    for name, value in zip(names, values):
+        escaped = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        parts.append(f'{name}="{escaped}"')
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+class MetricCounter:
+    """عداد تراكمي بتسميات"""
+    
+    kind = "counter"
+    
+    def __init__(self, name: str, description: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self.values: Dict[Tuple, float] = defaultdict(float)
+    
+    def inc(self, amount: float = 1, labels: Tuple = ()):
+        self.values[labels] += amount
+    
+    def render(self) -> List[str]:
+        return [
+            f"{self.name}{format_metric_labels(self.labels, key)} {value}"
+            for key, value in self.values.items()
+        ]
+
+class MetricGauge:
+    """مقياس لحظي، قيمته مخزنة أو محسوبة عند القراءة"""
+    
+    kind = "gauge"
+    
+    def __init__(self, name: str, description: str, labels: Tuple[str, ...] = (),
+                 function: Optional[Callable[[], Dict[Tuple, float]]] = None):
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self.values: Dict[Tuple, float] = {}
+        self.functions: List[Callable[[], Dict[Tuple, float]]] = [function] if function else []
+    
+    def set(self, value: float, labels: Tuple = ()):
+        self.values[labels] = value
+    
+    def add_function(self, function: Callable[[], Dict[Tuple, float]]):
+        """إضافة دالة تعيد القيم عند كل قراءة"""
+        self.functions.append(function)
+    
+    def render(self) -> List[str]:
+        values = dict(self.values)
+        for function in self.functions:
+            try:
+                values.update(function())
+            except Exception as e:
+                logger.error(f"خطأ في قراءة المقياس {self.name}: {e}")
+        return [
+            f"{self.name}{format_metric_labels(self.labels, key)} {value}"
+            for key, value in values.items()
+            if value is not None
+        ]
+
+class MetricHistogram:
+    """مدرج تكراري لأزمنة التنفيذ"""
+    
+    kind = "histogram"
+    
+    def __init__(self, name: str, description: str, labels: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self.buckets = buckets
+        # لكل تسمية: [أعداد الفئات..., المجموع، العدد]
+        self.values: Dict[Tuple, List[float]] = {}
+    
+    def observe(self, value: float, labels: Tuple = ()):
+        series = self.values.get(labels)
+        if series is None:
+            series = self.values[labels] = [0] * (len(self.buckets) + 2)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                series[i] += 1
+                break
+        series[-2] += value
+        series[-1] += 1
+    
+    def mean(self, labels: Tuple = ()) -> Optional[float]:
+        """متوسط القيم المرصودة"""
+        series = self.values.get(labels)
+        if not series or not series[-1]:
+            return None
+        return series[-2] / series[-1]
+    
+    def render(self) -> List[str]:
+        lines = []
+        for key, series in self.values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                bucket_labels = format_metric_labels(self.labels, key, 'le="%s"' % bound)
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            bucket_labels = format_metric_labels(self.labels, key, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{bucket_labels} {series[-1]}")
+            lines.append(f"{self.name}_sum{format_metric_labels(self.labels, key)} {series[-2]}")
+            lines.append(f"{self.name}_count{format_metric_labels(self.labels, key)} {series[-1]}")
+        return lines
+
+class MetricsRegistry:
+    """سجل المقاييس وتصديرها بصيغة النص"""
+    
+    def __init__(self):
+        self.metrics: List[Any] = []
+    
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+    
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.description}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+metrics = MetricsRegistry()
+webhook_duration = metrics.register(MetricHistogram(
+    "bot_webhook_duration_seconds", "Time spent handling a webhook request"))
+spam_detector_duration = metrics.register(MetricHistogram(
+    "bot_spam_detector_duration_seconds", "Time spent in each contains_spam detector", ("detector",)))
+api_request_duration = metrics.register(MetricHistogram(
+    "bot_api_request_duration_seconds", "Bot API call latency by method", ("method",)))
+api_request_errors = metrics.register(MetricCounter(
+    "bot_api_request_errors_total", "Failed Bot API calls by method and error type", ("method", "error")))
+persistence_flush_duration = metrics.register(MetricHistogram(
+    "bot_persistence_flush_seconds", "Time spent persisting state", ("target",)))
+cache_requests = metrics.register(MetricCounter(
+    "bot_cache_requests_total", "Cache lookups by cache and result", ("cache", "result")))
+queue_depth = metrics.register(MetricGauge(
+    "bot_queue_depth", "Items waiting in internal queues", ("queue",)))
+asyncio_tasks_gauge = metrics.register(MetricGauge(
+    "bot_asyncio_tasks", "Pending asyncio tasks",
+    function=lambda: {(): len(asyncio.all_tasks())}))
+http_connections = metrics.register(MetricGauge(
+    "bot_http_connections", "Connections in the Bot API HTTP pool", ("state",),
+    function=lambda: {(state,): count for state, count in bot.session.pool_state().items()}))
+http_connection_events = metrics.register(MetricGauge(
+    "bot_http_connection_events", "Bot API connections opened or reused since start", ("event",),
+    function=lambda: {(event,): count for event, count in bot.session.connection_stats.items()}))
+
+def record_cache_lookup(cache: str, hit: bool):
+    """تسجيل نتيجة البحث في ذاكرة مؤقتة"""
+    cache_requests.inc(labels=(cache, "hit" if hit else "miss"))
+
+def observe_detector(detector: str, started: float) -> float:
+    """تسجيل زمن كاشف وإرجاع بداية الكاشف التالي"""
+    now = time.perf_counter()
+    spam_detector_duration.observe(now - started, (detector,))
+    return now
+
+class ApiMetricsMiddleware(BaseRequestMiddleware):
+    """قياس زمن طلبات Bot API حسب الطريقة"""
+    
+    async def __call__(self, make_request, bot, method):
+        name = method.__api_method__
+        started = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        except Exception as e:
+            api_request_errors.inc(labels=(name, type(e).__name__))
+            raise
+        finally:
+            api_request_duration.observe(time.perf_counter() - started, (name,))
+
+# ================== جدولة طلبات Bot API الصادرة ==================
+OUTBOUND_GLOBAL_RATE = float(os.getenv("OUTBOUND_GLOBAL_RATE", 25))   # طلب/ثانية لكل البوت
+OUTBOUND_GLOBAL_BURST = 30
+OUTBOUND_GROUP_RATE = float(os.getenv("OUTBOUND_GROUP_RATE", 20 / 60))  # حد تيليجرام للمجموعات
+OUTBOUND_GROUP_BURST = 5
+OUTBOUND_PRIVATE_RATE = 1.0
+OUTBOUND_PRIVATE_BURST = 3
+OUTBOUND_MAX_RETRIES = 3
+OUTBOUND_MAX_CHAT_BUCKETS = 10000
+
+class OutboundPriority(IntEnum):
+    MODERATION = 0    # الحظر والكتم والحذف
+    NOTIFICATION = 1  # الإشعارات والردود
+    REPORT = 2        # التقارير والإحصائيات والبث
+
+# طرق الإشراف تتقدم على غيرها افتراضياً
+MODERATION_METHODS = {
+    'banChatMember', 'unbanChatMember', 'restrictChatMember',
+    'deleteMessage', 'deleteMessages'
+}
+# حد المحادثة يخص إرسال الرسائل فقط؛ الإشراف والحذف والتعديل تخضع للحد العام وحده
+OUTBOUND_CHAT_LIMITED_METHODS = {'copyMessage', 'copyMessages', 'forwardMessage', 'forwardMessages'}
+
+def chat_limited_method(name: str) -> bool:
+    """هل تخضع الطريقة لحد الرسائل لكل محادثة"""
+    return name.startswith('send') or name in OUTBOUND_CHAT_LIMITED_METHODS
+
+# طرق لا تخضع لحدود الإرسال
+OUTBOUND_EXEMPT_METHODS = {
+    'answerCallbackQuery', 'setWebhook', 'deleteWebhook', 'getUpdates',
+    'logOut', 'close'
+}
+
+_outbound_priority: contextvars.ContextVar[Optional[OutboundPriority]] = contextvars.ContextVar(
+    "outbound_priority", default=None
+)
+
+@contextlib.contextmanager
+def outbound_priority(priority: OutboundPriority):
+    """تحديد أولوية طلبات API داخل الكتلة"""
+    token = _outbound_priority.set(priority)
+    try:
+        yield
+    finally:
+        _outbound_priority.reset(token)
+
+class TokenBucket:
+    """دلو رموز لتحديد معدل الطلبات"""
+    
+    __slots__ = ('rate', 'capacity', 'tokens', 'updated', 'blocked_until')
+    
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = 0.0
+        self.blocked_until = 0.0
+    
+    def _refill(self, now: float):
+        if self.updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+    
+    def delay(self, now: float) -> float:
+        """الوقت المتبقي حتى توفر رمز"""
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+    
+    def consume(self, now: float):
+        self._refill(now)
+        self.tokens -= 1
+    
+    def block(self, until: float):
+        """إيقاف الدلو حتى وقت محدد (retry_after)"""
+        self.blocked_until = max(self.blocked_until, until)
+        self.tokens = 0
+    
+    def idle(self, now: float) -> bool:
+        """الدلو ممتلئ ولا يؤثر على الجدولة"""
+        return now >= self.blocked_until and self.tokens + (now - self.updated) * self.rate >= self.capacity
+
+class OutboundScheduler:
+    """جدولة الطلبات الصادرة حسب الأولوية وحدود كل محادثة والحد العام"""
+    
+    def __init__(self):
+        self.global_bucket = TokenBucket(OUTBOUND_GLOBAL_RATE, OUTBOUND_GLOBAL_BURST)
+        self.chat_buckets: Dict[Any, TokenBucket] = {}
+        self.ready: List[Tuple[int, int, float, Any, asyncio.Future]] = []
+        self.deferred: List[Tuple[float, Tuple]] = []
+        self.depth: Dict[OutboundPriority, int] = defaultdict(int)
+        self._seq = 0
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._loop = None
+    
+    def _chat_bucket(self, chat_id) -> TokenBucket:
+        bucket = self.chat_buckets.get(chat_id)
+        if bucket is None:
+            if len(self.chat_buckets) >= OUTBOUND_MAX_CHAT_BUCKETS:
+                self._prune_buckets()
+            # المعرفات السالبة للمجموعات والقنوات
+            if isinstance(chat_id, int) and chat_id > 0:
+                bucket = TokenBucket(OUTBOUND_PRIVATE_RATE, OUTBOUND_PRIVATE_BURST)
+            else:
+                bucket = TokenBucket(OUTBOUND_GROUP_RATE, OUTBOUND_GROUP_BURST)
+            self.chat_buckets[chat_id] = bucket
+        return bucket
+    
+    def _prune_buckets(self):
+        now = asyncio.get_running_loop().time()
+        for chat_id in [c for c, b in self.chat_buckets.items() if b.idle(now)]:
+            del self.chat_buckets[chat_id]
+    
+    def _ensure_running(self):
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done() or self._loop is not loop:
+            self._loop = loop
+            self._wakeup = asyncio.Event()
+            self._task = loop.create_task(self._run())
+    
+    async def acquire(self, priority: OutboundPriority, chat_id=None):
+        """انتظار الإذن بإرسال طلب"""
+        self._ensure_running()
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._seq += 1
+        heapq.heappush(self.ready, (int(priority), self._seq, loop.time(), chat_id, future))
+        self.depth[priority] += 1
+        self._wakeup.set()
+        await future
+    
+    def penalize(self, chat_id, retry_after: float):
+        """إيقاف الإرسال بعد خطأ 429"""
+        until = asyncio.get_running_loop().time() + retry_after
+        if chat_id is None:
+            self.global_bucket.block(until)
+        else:
+            self._chat_bucket(chat_id).block(until)
+        logger.warning(f"تجاوز حد الإرسال للمحادثة {chat_id}، انتظار {retry_after} ثانية")
+    
+    async def _wait(self, timeout: Optional[float]):
+        """انتظار طلب جديد أو انقضاء المهلة"""
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+    
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            # أي طلب يصل بعد هذه النقطة يوقظ الانتظار التالي
+            self._wakeup.clear()
+            now = loop.time()
+            while self.deferred and self.deferred[0][0] <= now:
+                heapq.heappush(self.ready, heapq.heappop(self.deferred)[1])
+            
+            if not self.ready:
+                await self._wait(self.deferred[0][0] - now if self.deferred else None)
+                continue
+            
+            entry = heapq.heappop(self.ready)
+            priority, _, enqueued, chat_id, future = entry
+            if future.done():
+                self.depth[OutboundPriority(priority)] -= 1
+                continue
+            
+            if chat_id is not None:
+                chat_delay = self._chat_bucket(chat_id).delay(now)
+                if chat_delay > 0:
+                    # المحادثة مشغولة: تأجيلها دون حجب المحادثات الأخرى
+                    heapq.heappush(self.deferred, (now + chat_delay, entry))
+                    continue
+            
+            global_delay = self.global_bucket.delay(now)
+            if global_delay > 0:
+                # الاستيقاظ مبكراً عند وصول طلب أعلى أولوية
+                heapq.heappush(self.ready, entry)
+                if self.deferred:
+                    global_delay = min(global_delay, self.deferred[0][0] - now)
+                await self._wait(global_delay)
+                continue
+            
+            self.global_bucket.consume(now)
+            if chat_id is not None:
+                self._chat_bucket(chat_id).consume(now)
+            self.depth[OutboundPriority(priority)] -= 1
+            outbound_wait.observe(now - enqueued, (OutboundPriority(priority).name.lower(),))
+            future.set_result(None)
+
+outbound_scheduler = OutboundScheduler()
+outbound_wait = metrics.register(MetricHistogram(
+    "bot_outbound_queue_wait_seconds", "Time outbound API calls waited for a send slot", ("priority",)))
+outbound_retries = metrics.register(MetricCounter(
+    "bot_outbound_retries_total", "Outbound API calls retried after 429", ("method",)))
+queue_depth.add_function(lambda: {
+    (f"outbound_{priority.name.lower()}",): outbound_scheduler.depth[priority]
+    for priority in OutboundPriority
+})
+
+class OutboundSchedulerMiddleware(BaseRequestMiddleware):
+    """تمرير الطلبات الصادرة عبر جدول الأولويات مع احترام retry_after"""
+    
+    async def __call__(self, make_request, bot, method):
+        name = method.__api_method__
+        if name in OUTBOUND_EXEMPT_METHODS or name.startswith('get'):
+            return await make_request(bot, method)
+        
+        priority = _outbound_priority.get()
+        if priority is None:
+            priority = OutboundPriority.MODERATION if name in MODERATION_METHODS else OutboundPriority.NOTIFICATION
+        chat_id = getattr(method, 'chat_id', None) if chat_limited_method(name) else None
+        
+        for attempt in range(OUTBOUND_MAX_RETRIES + 1):
+            await outbound_scheduler.acquire(priority, chat_id)
+            try:
+                return await make_request(bot, method)
+            except TelegramRetryAfter as e:
+                outbound_retries.inc(labels=(name,))
+                outbound_scheduler.penalize(chat_id, e.retry_after)
+                if attempt == OUTBOUND_MAX_RETRIES:
+                    raise
+
+# الجدولة أولاً ثم القياس، ليقيس زمن الطلب الفعلي دون الانتظار
+bot.session.middleware(OutboundSchedulerMiddleware())
+bot.session.middleware(ApiMetricsMiddleware())
+
 # ================== أنماط الكشف المتقدمة ==================
 def normalize_digits(text: str) -> str:
     """تطبيع الأرقام العربية والفارسية"""
@@ -272,7 +873,150 @@ class Form(StatesGroup):
     waiting_for_report_type = State()
     waiting_for_export_format = State()
 
+# ================== الذاكرة المؤقتة للأسماء ==================
+NAME_CACHE_TTL = 6 * 3600
+NAME_CACHE_SIZE = 20000
+
+class TTLCache:
+    """ذاكرة مؤقتة محدودة الحجم بصلاحية زمنية (الأقدم استخداماً يُحذف أولاً)"""
+    
+    def __init__(self, name: str, maxsize: int, ttl: float):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.data: OrderedDict = OrderedDict()  # المفتاح -> (وقت الانتهاء، القيمة)
+    
+    def get(self, key, default=None):
+        """قراءة قيمة صالحة مع تسجيل الإصابة أو الإخفاق"""
+        entry = self.data.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del self.data[key]
+            record_cache_lookup(self.name, False)
+            return default
+        self.data.move_to_end(key)
+        record_cache_lookup(self.name, True)
+        return entry[1]
+    
+    def set(self, key, value, ttl: Optional[float] = None):
+        """تخزين قيمة"""
+        self.data[key] = (time.monotonic() + (ttl or self.ttl), value)
+        self.data.move_to_end(key)
+        while len(self.data) > self.maxsize:
+            self.data.popitem(last=False)
+    
+    def pop(self, key, default=None):
+        """حذف قيمة"""
+        entry = self.data.pop(key, None)
+        return entry[1] if entry else default
+    
+    def __len__(self) -> int:
+        return len(self.data)
+
+ADMIN_CACHE_TTL = 300  # قائمة الإداريين تتغير نادراً
+
+chat_titles = TTLCache("chat_titles", NAME_CACHE_SIZE, NAME_CACHE_TTL)
+user_names = TTLCache("user_names", NAME_CACHE_SIZE, NAME_CACHE_TTL)
+chat_admins = TTLCache("chat_admins", 1000, ADMIN_CACHE_TTL)
+
+cache_entries = metrics.register(MetricGauge(
+    "bot_cache_entries", "Entries held in each cache", ("cache",),
+    function=lambda: {(c.name,): len(c) for c in (chat_titles, user_names, chat_admins, panel_cache, edit_fingerprints)}))
+
+# ================== ذاكرة اللوحات ==================
+PANEL_STATS_BUCKET = 30  # ثوانٍ تبقى فيها أرقام الإحصائيات في اللوحة المخزنة
+
+panel_cache = TTLCache("panels", 500, PANEL_STATS_BUCKET * 2)
+# نسخة لكل مجموعة، ونسخة عامة للتغييرات التي لا تُعرف مجموعتها
+settings_versions: Dict[str, int] = defaultdict(int)
+settings_epoch = 0
+
+def touch_settings(*group_ids):
+    """تسجيل تغيير في إعدادات مجموعات محددة (أو كلها) لإبطال لوحاتها المخزنة"""
+    global settings_epoch
+    if not group_ids:
+        settings_epoch += 1
+    for group_id in group_ids:
+        settings_versions[str(group_id)] += 1
+
+def cached_panel(panel: str, stats: bool = False):
+    """تخزين نص ولوحة أزرار اللوحة حسب (المجموعة، اللوحة، نسخة إعداداتها، فترة الإحصائيات)"""
+    def decorator(render: Callable[[int], Tuple[str, InlineKeyboardMarkup]]):
+        def wrapper(group_id: int) -> Tuple[str, InlineKeyboardMarkup]:
+            bucket = int(time.time() // PANEL_STATS_BUCKET) if stats else None
+            key = (group_id, panel, settings_epoch, settings_versions[str(group_id)], bucket)
+            rendered = panel_cache.get(key)
+            if rendered is None:
+                rendered = render(group_id)
+                panel_cache.set(key, rendered)
+            return rendered
+        wrapper.__doc__ = render.__doc__
+        return wrapper
+    return decorator
+
+def remember_names(chat: Optional[types.Chat] = None, user: Optional[types.User] = None):
+    """تعبئة الذاكرة المؤقتة من التحديثات الواردة"""
+    if chat is not None and chat.title:
+        chat_titles.set(chat.id, chat.title)
+    if user is not None:
+        user_names.set(user.id, user.full_name)
+
+def peek_chat_title(chat_id: int, default: str) -> str:
+    """اسم المحادثة من الذاكرة المؤقتة فقط"""
+    return chat_titles.get(chat_id, default)
+
+async def get_chat_title(chat_id: int) -> str:
+    """اسم المحادثة من الذاكرة المؤقتة أو من API عند الإخفاق"""
+    title = chat_titles.get(chat_id)
+    if title is None:
+        try:
+            chat = await bot.get_chat(chat_id)
+            title = chat.title or chat.full_name
+            chat_titles.set(chat_id, title)
+        except Exception as e:
+            logger.error(f"خطأ في جلب اسم المحادثة {chat_id}: {e}")
+            return f"مجموعة {chat_id}"
+    return title
+
+async def get_user_name(chat_id: int, user_id: int) -> str:
+    """اسم العضو من الذاكرة المؤقتة أو من API عند الإخفاق"""
+    name = user_names.get(user_id)
+    if name is None:
+        try:
+            member = await bot.get_chat_member(chat_id, user_id)
+            name = member.user.full_name
+            user_names.set(user_id, name)
+        except Exception:
+            return f"مستخدم {user_id}"
+    return name
+
 # ================== وظائف المساعدة المتقدمة ==================
+# مراجع المهام الخلفية حتى لا تُجمع قبل انتهائها
+background_task_set: Set[asyncio.Task] = set()
+
+def spawn_background(coro, label: str) -> asyncio.Task:
+    """تشغيل مهمة خلفية مع الاحتفاظ بمرجعها وتسجيل أخطائها"""
+    task = asyncio.create_task(coro)
+    background_task_set.add(task)
+    
+    def done(task: asyncio.Task):
+        background_task_set.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"خطأ في المهمة الخلفية {label}: {task.exception()}")
+    
+    task.add_done_callback(done)
+    return task
+
+def classify_delivery_error(error: Exception) -> str:
+    """تصنيف سبب فشل إرسال رسالة"""
+    if isinstance(error, TelegramForbiddenError):
+        return 'kicked'
+    if isinstance(error, TelegramRetryAfter):
+        return 'flood'
+    if isinstance(error, TelegramBadRequest) and 'chat not found' in str(error).lower():
+        return 'not_found'
+    return 'error'
+
 async def is_admin(chat_id: int, user_id: int) -> bool:
     """التحقق إذا كان المستخدم مسؤولاً"""
     try:
@@ -318,6 +1062,14 @@ def get_formatted_time() -> str:
     now = datetime.now()
     return now.strftime("%Y-%m-%d %H:%M:%S")
 
+def get_uptime() -> str:
+    """وقت التشغيل المنسق"""
+    uptime = time.time() - bot_stats['start_time']
+    days = int(uptime // 86400)
+    hours = int((uptime % 86400) // 3600)
+    minutes = int((uptime % 3600) // 60)
+    return f"{days} يوم, {hours} ساعة, {minutes} دقيقة"
+
 def format_number(num: int) -> str:
     """تنسيق الأرقام"""
     if num >= 1000000:
@@ -326,6 +1078,14 @@ def format_number(num: int) -> str:
         return f"{num/1000:.1f}K"
     return str(num)
 
+def format_trend(current: int, previous: int) -> str:
+    """تنسيق التغير مقارنة بالفترة السابقة"""
+    if previous == 0:
+        return "جديد" if current else "بدون تغيير"
+    change = (current - previous) / previous * 100
+    arrow = "📈" if change > 0 else "📉" if change < 0 else "➖"
+    return f"{arrow} {change:+.0f}%"
+
 def get_random_emoji() -> str:
     """الحصول على إيموجي عشوائي"""
     emojis = ["✨", "🚀", "🔥", "⭐", "🎯", "💎", "👑", "🛡️", "⚡", "🎊", "🎉", "🏆", "💪", "👏", "👍"]
@@ -338,19 +1098,271 @@ async def send_typing(chat_id: int):
     except:
         pass
 
+# ================== تجميع حذف الرسائل ==================
+DELETE_BATCH_WINDOW = float(os.getenv("DELETE_BATCH_WINDOW", 0.5))  # ثوانٍ
+DELETE_BATCH_MAX = 100  # حد deleteMessages
+
+deleted_messages = metrics.register(MetricCounter(
+    "bot_deleted_messages_total", "Messages deleted by delivery mode", ("mode",)))
+
+class DeletionBatcher:
+    """تجميع رسائل الحذف لكل محادثة وإرسالها عبر deleteMessages"""
+    
+    def __init__(self):
+        self.pending: Dict[int, List[int]] = {}
+        self.timers: Dict[int, asyncio.TimerHandle] = {}
+        self.tasks: Set[asyncio.Task] = set()
+    
+    def schedule(self, chat_id: int, message_id: int):
+        """إضافة رسالة لدفعة الحذف القادمة"""
+        ids = self.pending.setdefault(chat_id, [])
+        if message_id in ids:
+            return
+        ids.append(message_id)
+        
+        if len(ids) >= DELETE_BATCH_MAX:
+            self._spawn_flush(chat_id)
+        elif chat_id not in self.timers:
+            loop = asyncio.get_running_loop()
+            self.timers[chat_id] = loop.call_later(DELETE_BATCH_WINDOW, self._spawn_flush, chat_id)
+    
+    def _take(self, chat_id: int) -> List[int]:
+        timer = self.timers.pop(chat_id, None)
+        if timer is not None:
+            timer.cancel()
+        return self.pending.pop(chat_id, None) or []
+    
+    def _spawn_flush(self, chat_id: int):
+        task = asyncio.get_running_loop().create_task(self._delete(chat_id, self._take(chat_id)))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+    
+    async def flush(self, chat_id: int):
+        """حذف الرسائل المعلقة لمحادثة"""
+        await self._delete(chat_id, self._take(chat_id))
+    
+    async def _delete(self, chat_id: int, ids: List[int]):
+        if not ids:
+            return
+        
+        if len(ids) > 1:
+            try:
+                await bot.delete_messages(chat_id, ids)
+                deleted_messages.inc(len(ids), ("batch",))
+                return
+            except Exception as e:
+                logger.warning(f"فشل الحذف الجماعي في {chat_id}، الرجوع للحذف الفردي: {e}")
+        
+        for message_id in ids:
+            try:
+                await bot.delete_message(chat_id, message_id)
+                deleted_messages.inc(labels=("single",))
+            except Exception:
+                pass
+    
+    async def flush_all(self):
+        """حذف كل الرسائل المعلقة (عند الإيقاف)"""
+        await asyncio.gather(*(self.flush(chat_id) for chat_id in list(self.pending)), *self.tasks)
+    
+    def depth(self) -> int:
+        return sum(len(ids) for ids in self.pending.values())
+
+deletion_batcher = DeletionBatcher()
+queue_depth.add_function(lambda: {("pending_deletions",): deletion_batcher.depth()})
+
 async def safe_delete_message(chat_id: int, message_id: int):
-    """حذف رسالة بأمان"""
+    """حذف رسالة بأمان (ضمن دفعة حذف مجمعة)"""
     try:
-        await bot.delete_message(chat_id, message_id)
-    except:
-        pass
+        deletion_batcher.schedule(chat_id, message_id)
+    except Exception as e:
+        logger.error(f"خطأ في جدولة حذف الرسالة: {e}")
+
+# ================== الإجراءات المؤجلة ==================
+WARNING_EXPIRY = 2592000  # مدة صلاحية التحذير (30 يوم)
+# الإجراءات تُحفظ محلياً لأن رسالة الإعدادات محدودة بـ 4096 حرفاً
+DELAYED_ACTIONS_PATH = os.getenv("DELAYED_ACTIONS_PATH", FSM_STORAGE_PATH)
+
+delayed_actions_executed = metrics.register(MetricCounter(
+    "bot_delayed_actions_total", "Delayed actions executed", ("kind", "status")))
+
+class DelayedActionScheduler:
+    """جدولة الإجراءات المؤجلة (حذف إشعار) بكومة واحدة بدل sleep داخل المعالجات"""
+    
+    def __init__(self, path: str):
+        self.heap: List[Tuple[float, int, str]] = []
+        self.pending: Dict[str, Dict[str, Any]] = {}
+        self.handlers: Dict[str, Callable] = {}
+        self._seq = 0
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._loop = None
+        self._lock = threading.Lock()
+        # خيط كتابة واحد: لا تنتظر حلقة الأحداث قفل الملف المشترك، ويبقى الحذف بعد الإدراج بالترتيب
+        self._writer = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="delayed-actions")
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        # الإجراءات صغيرة، فلا حاجة لـ fsync مع كل إدراج
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS delayed_actions ("
+            "id TEXT PRIMARY KEY, chat_id INTEGER NOT NULL, due REAL NOT NULL, action TEXT NOT NULL)"
+        )
+        self._db.commit()
+    
+    def _execute(self, sql: str, params: Tuple = ()) -> List[Tuple]:
+        with self._lock:
+            rows = self._db.execute(sql, params).fetchall()
+            self._db.commit()
+            return rows
+    
+    def _write(self, sql: str, params: Tuple = ()):
+        try:
+            self._execute(sql, params)
+        except sqlite3.Error as e:
+            # الإجراء يُنفذ في هذه الجلسة حتى لو تعذر حفظه
+            logger.error(f"خطأ في حفظ الإجراءات المؤجلة: {e}")
+    
+    def _submit(self, sql: str, params: Tuple = ()) -> asyncio.Future:
+        return asyncio.get_running_loop().run_in_executor(self._writer, self._write, sql, params)
+    
+    def handler(self, kind: str):
+        """تسجيل منفذ لنوع إجراء"""
+        def decorator(func):
+            self.handlers[kind] = func
+            return func
+        return decorator
+    
+    def _ensure_running(self):
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done() or self._loop is not loop:
+            self._loop = loop
+            self._wakeup = asyncio.Event()
+            self._task = loop.create_task(self._run())
+    
+    def _push(self, action: Dict[str, Any]):
+        self._seq += 1
+        self.pending[action['id']] = action
+        heapq.heappush(self.heap, (action['due'], self._seq, action['id']))
+    
+    def schedule(self, chat_id: int, kind: str, delay: float, **payload) -> str:
+        """جدولة إجراء بعد مدة (يُحفظ في SQLite ليبقى بعد إعادة التشغيل)"""
+        self._seq += 1
+        action = {
+            'id': f"{int(time.time() * 1000)}-{os.getpid()}-{self._seq}",
+            'chat_id': chat_id,
+            'kind': kind,
+            'due': time.time() + delay,
+            **payload
+        }
+        self._submit(
+            "INSERT OR REPLACE INTO delayed_actions (id, chat_id, due, action) VALUES (?, ?, ?, ?)",
+            (action['id'], chat_id, action['due'], json.dumps(action, ensure_ascii=False))
+        )
+        self._push(action)
+        self._ensure_running()
+        self._wakeup.set()
+        return action['id']
+    
+    async def restore(self):
+        """إعادة تحميل الإجراءات المحفوظة للمجموعات المملوكة بعد إعادة التشغيل"""
+        owned = set(owned_group_ids())
+        count = 0
+        rows = await asyncio.get_running_loop().run_in_executor(
+            self._writer, self._execute, "SELECT chat_id, action FROM delayed_actions ORDER BY due")
+        for chat_id, raw in rows:
+            if chat_id not in owned:
+                continue
+            action = json.loads(raw)
+            if action.get('id') not in self.pending:
+                self._push(action)
+                count += 1
+        if count:
+            logger.info(f"تم استرجاع {count} إجراء مؤجل")
+        self._ensure_running()
+        self._wakeup.set()
+    
+    def _forget(self, action_id: str):
+        self.pending.pop(action_id, None)
+        self._submit("DELETE FROM delayed_actions WHERE id = ?", (action_id,))
+    
+    async def _execute_action(self, action: Dict[str, Any]):
+        kind = action.get('kind')
+        func = self.handlers.get(kind)
+        status = 'ok'
+        try:
+            if func is None:
+                status = 'unknown'
+                logger.warning(f"نوع إجراء مؤجل غير معروف: {kind}")
+            else:
+                await func(action['chat_id'], action)
+        except Exception as e:
+            status = 'error'
+            logger.error(f"خطأ في تنفيذ الإجراء المؤجل {kind}: {e}")
+        finally:
+            self._forget(action['id'])
+            delayed_actions_executed.inc(labels=(kind, status))
+    
+    async def _run(self):
+        while True:
+            now = time.time()
+            while self.heap and self.heap[0][0] <= now:
+                _, _, action_id = heapq.heappop(self.heap)
+                action = self.pending.get(action_id)
+                if action is not None:
+                    await self._execute_action(action)
+            
+            timeout = self.heap[0][0] - now if self.heap else None
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+    
+    async def close(self):
+        # انتظار الكتابات المعلقة قبل إغلاق الاتصال
+        await asyncio.to_thread(self._writer.shutdown)
+        with self._lock:
+            self._db.close()
+
+delayed_actions = DelayedActionScheduler(DELAYED_ACTIONS_PATH)
+queue_depth.add_function(lambda: {("delayed_actions",): len(delayed_actions.pending)})
+
+@delayed_actions.handler('delete_message')
+async def _delayed_delete_message(chat_id: int, action: Dict[str, Any]):
+    await safe_delete_message(chat_id, action['message_id'])
+
+EDIT_FINGERPRINT_TTL = 3600
+
+edit_fingerprints = TTLCache("edit_fingerprints", 5000, EDIT_FINGERPRINT_TTL)
+edits_skipped = metrics.register(MetricCounter(
+    "bot_edits_skipped_total", "Message edits skipped because the content was unchanged"))
+
+def render_fingerprint(text: str, keyboard: Optional[InlineKeyboardMarkup]) -> bytes:
+    """بصمة النص ولوحة الأزرار المعروضة"""
+    digest = hashlib.blake2b(text.encode('utf-8'), digest_size=16)
+    if keyboard is not None:
+        digest.update(keyboard.model_dump_json(exclude_none=True).encode('utf-8'))
+    return digest.digest()
 
 async def safe_edit_message(callback: CallbackQuery, text: str, keyboard: InlineKeyboardMarkup = None):
-    """تعديل رسالة بأمان"""
+    """تعديل رسالة بأمان (بدون طلب إذا لم يتغير المحتوى)"""
+    message = callback.message
+    key = (message.chat.id, message.message_id)
+    fingerprint = None
+    
     try:
-        await callback.message.edit_text(text, reply_markup=keyboard, disable_web_page_preview=True)
+        fingerprint = render_fingerprint(text, keyboard)
+        if edit_fingerprints.get(key) == fingerprint:
+            edits_skipped.inc()
+            return
+        
+        await message.edit_text(text, reply_markup=keyboard, disable_web_page_preview=True)
+        edit_fingerprints.set(key, fingerprint)
     except Exception as e:
-        if "message is not modified" not in str(e):
+        if fingerprint is not None and "message is not modified" in str(e):
+            edit_fingerprints.set(key, fingerprint)
+        else:
+            edit_fingerprints.pop(key)
             logger.error(f"خطأ في تعديل الرسالة: {e}")
 
 # ================== نظام الكشف المتقدم ==================
@@ -368,6 +1380,7 @@ def contains_spam(text: str, group_str: str = None) -> Dict[str, Any]:
     if not text or not isinstance(text, str):
         return result
     
+    started = clock = time.perf_counter()
     normalized = normalize_digits(text)
     text_lower = text.lower()
     
@@ -377,37 +1390,46 @@ def contains_spam(text: str, group_str: str = None) -> Dict[str, Any]:
     # 1. اكتشاف الأرقام الهاتفية
     if PHONE_PATTERN.search(normalized):
         detections.append(("phone", 85, "رقم هاتف"))
+    clock = observe_detector("phone", clock)
     
     # 2. اكتشاف البريد الإلكتروني
     if EMAIL_PATTERN.search(text):
         detections.append(("email", 70, "بريد إلكتروني"))
+    clock = observe_detector("email", clock)
     
     # 3. اكتشاف العملات الرقمية
     if CRYPTO_PATTERN.search(text_lower):
         detections.append(("crypto", 90, "عملة رقمية"))
+    clock = observe_detector("crypto", clock)
     
     # 4. اكتشاف عناوين IP
     if IP_PATTERN.search(text):
         detections.append(("ip", 60, "عنوان IP"))
+    clock = observe_detector("ip", clock)
     
     # 5. روابط الدعوات
     if WHATSAPP_INVITE_PATTERN.search(text):
         detections.append(("whatsapp", 95, "رابط واتساب"))
+    clock = observe_detector("whatsapp", clock)
     
     if TELEGRAM_INVITE_PATTERN.search(text):
         detections.append(("telegram", 80, "رابط تيليجرام"))
+    clock = observe_detector("telegram", clock)
     
     # 6. روابط TikTok
     if TIKTOK_PATTERN.search(text):
         detections.append(("tiktok", 75, "رابط TikTok"))
+    clock = observe_detector("tiktok", clock)
     
     # 7. روابط مختصرة
     if SHORT_LINK_PATTERN.search(text):
         detections.append(("short_link", 85, "رابط مختصر"))
+    clock = observe_detector("short_link", clock)
     
     # 8. محتوى للكبار
     if ADULT_CONTENT_PATTERN.search(text_lower):
         detections.append(("adult", 95, "محتوى للكبار"))
+    clock = observe_detector("adult", clock)
     
     # 9. كلمات ممنوعة مخصصة
     if group_str and group_str in settings:
@@ -422,6 +1444,7 @@ def contains_spam(text: str, group_str: str = None) -> Dict[str, Any]:
         
         if found_keywords:
             detections.append(("banned_keywords", result["confidence"], f"كلمات ممنوعة: {', '.join(found_keywords[:3])}"))
+    clock = observe_detector("banned_keywords", clock)
     
     # 10. روابط غير مسموحة
     urls = re.findall(r'https?://[^\s]+|www\.[^\s]+|[^\s]+\.[^\s]{2,}', text, re.IGNORECASE)
@@ -437,6 +1460,7 @@ def contains_spam(text: str, group_str: str = None) -> Dict[str, Any]:
         
         if unauthorized_urls:
             detections.append(("unauthorized_links", result["confidence"], "روابط غير مسموحة"))
+    clock = observe_detector("unauthorized_links", clock)
     
     # 11. اكتشاف الرسائل الطويلة (سبام)
     words = text.split()
@@ -446,6 +1470,7 @@ def contains_spam(text: str, group_str: str = None) -> Dict[str, Any]:
     # 12. اكتشاف التكرار
     if len(set(words)) < len(words) * 0.3:  # تكرار كبير
         detections.append(("repetition", 65, "تكرار مفرط"))
+    clock = observe_detector("length_repetition", clock)
     
     # تحليل النتائج
     if detections:
@@ -470,18 +1495,58 @@ def contains_spam(text: str, group_str: str = None) -> Dict[str, Any]:
             result["severity"] = "low"
             result["action"] = "delete"
     
+    observe_detector("total", started)
     return result
 
 # ================== نظام التخزين والنسخ الاحتياطي ==================
-async def save_settings():
-    """حفظ الإعدادات"""
+def default_group_settings() -> Dict[str, Any]:
+    """الإعدادات الافتراضية لمجموعة جديدة"""
+    return {
+        'mode': 'smart_detection',
+        'mute_duration': 3600,
+        'ban_duration': 0,
+        'violations': {},
+        'warnings': {},
+        'banned_keywords': [],
+        'banned_links': [],
+        'banned_countries': [],
+        'exempted_users': [],
+        'vip_users': [],
+        'trusted_users': [],
+        'night_mode_enabled': False,
+        'night_start': '22:00',
+        'night_end': '06:00',
+        'night_announce_msg_id': None,
+        'applicants_system': True,
+        'auto_backup': True,
+        'weekly_reports': True,
+        'challenges_enabled': True,
+        'keep_notification': False,
+        'notification_duration': 120,
+        'welcome_message': "",
+        'rules': "",
+        'custom_commands': {},
+        'auto_replies': {},
+        'exact_active_users': False,
+        'last_backup': 0,
+        'last_weekly_report': '',
+        'created_at': time.time(),
+        'owner_id': None
+    }
+
+async def save_settings(*group_ids):
+    """حفظ الإعدادات (مع تحديد المجموعات المعدلة إن عُرفت)"""
     global SETTINGS_MESSAGE_ID
+    started = time.perf_counter()
+    # كل تعديل على الإعدادات يتبعه حفظ، لذلك يكفي الإبطال هنا
+    touch_settings(*group_ids)
     try:
         for group_str in settings:
             settings[group_str]['last_update'] = time.time()
         
         data = {
             "settings": settings,
+            "shard": list(cluster_shard) if cluster_shard else None,
             "version": VERSION,
             "timestamp": time.time(),
             "groups_count": len(settings)
@@ -489,64 +1554,38 @@ async def save_settings():
         
         text = json.dumps(data, ensure_ascii=False, indent=2)
         
-        if SETTINGS_MESSAGE_ID:
-            try:
-                await bot.edit_message_text(
-                    chat_id=DB_CHAT_ID,
-                    message_id=SETTINGS_MESSAGE_ID,
-                    text=text
-                )
-            except:
+        with outbound_priority(OutboundPriority.REPORT):
+            if SETTINGS_MESSAGE_ID:
+                try:
+                    await bot.edit_message_text(
+                        chat_id=DB_CHAT_ID,
+                        message_id=SETTINGS_MESSAGE_ID,
+                        text=text
+                    )
+                except:
+                    msg = await bot.send_message(DB_CHAT_ID, text)
+                    SETTINGS_MESSAGE_ID = msg.message_id
+            else:
                 msg = await bot.send_message(DB_CHAT_ID, text)
                 SETTINGS_MESSAGE_ID = msg.message_id
-        else:
-            msg = await bot.send_message(DB_CHAT_ID, text)
-            SETTINGS_MESSAGE_ID = msg.message_id
         
         logger.info("تم حفظ الإعدادات بنجاح")
         return True
     except Exception as e:
         logger.error(f"خطأ في حفظ الإعدادات: {e}")
         return False
+    finally:
+        persistence_flush_duration.observe(time.perf_counter() - started, ("settings",))
 
 async def load_settings():
     """تحميل الإعدادات"""
     global settings, SETTINGS_MESSAGE_ID
     try:
         # تحميل الإعدادات الأساسية
-        for gid in ALLOWED_GROUP_IDS:
+        for gid in owned_group_ids():
             group_str = str(gid)
             if group_str not in settings:
-                settings[group_str] = {
-                    'mode': 'smart_detection',
-                    'mute_duration': 3600,
-                    'ban_duration': 0,
-                    'violations': {},
-                    'warnings': {},
-                    'banned_keywords': [],
-                    'banned_links': [],
-                    'banned_countries': [],
-                    'exempted_users': [],
-                    'vip_users': [],
-                    'trusted_users': [],
-                    'night_mode_enabled': False,
-                    'night_start': '22:00',
-                    'night_end': '06:00',
-                    'night_announce_msg_id': None,
-                    'applicants_system': True,
-                    'auto_backup': True,
-                    'weekly_reports': True,
-                    'challenges_enabled': True,
-                    'keep_notification': False,
-                    'notification_duration': 120,
-                    'welcome_message': "",
-                    'rules': "",
-                    'custom_commands': {},
-                    'auto_replies': {},
-                    'last_backup': 0,
-                    'created_at': time.time(),
-                    'owner_id': None
-                }
+                settings[group_str] = default_group_settings()
         
         # محاولة تحميل من قاعدة البيانات
         try:
@@ -558,6 +1597,9 @@ async def load_settings():
                 if msg.text and msg.text.strip().startswith('{'):
                     try:
                         data = json.loads(msg.text)
+                        # في وضع العمليات المتعددة لكل عامل رسالة إعدادات خاصة بجزئه
+                        if data.get('shard') != (list(cluster_shard) if cluster_shard else None):
+                            continue
                         if 'settings' in data:
                             loaded_settings = data['settings']
                             for group_str in loaded_settings:
@@ -580,49 +1622,813 @@ async def load_settings():
         logger.error(f"خطأ في تحميل الإعدادات: {e}")
         return False
 
-async def create_backup(group_id: int, manual: bool = False):
-    """إنشاء نسخة احتياطية"""
+# مفاتيح تتغير تلقائياً ولا تعتبر تعديلاً على إعدادات المجموعة
+BACKUP_VOLATILE_KEYS = ('last_update', 'last_backup', 'last_weekly_report', 'backup_hash', 'night_announce_msg_id')
+BACKUP_COMPRESSION_LEVEL = 6
+
+def group_settings_fingerprint(group_str: str) -> str:
+    """بصمة إعدادات المجموعة لاكتشاف التغييرات منذ آخر نسخة"""
+    group_settings = settings.get(group_str, {})
+    stable = {k: v for k, v in group_settings.items() if k not in BACKUP_VOLATILE_KEYS}
+    raw = json.dumps(stable, ensure_ascii=False, default=str).encode('utf-8')
+    return hashlib.sha1(raw).hexdigest()
+
+def group_changed_since_backup(group_str: str) -> bool:
+    """التحقق إذا تغيرت إعدادات المجموعة منذ آخر نسخة احتياطية"""
+    if group_str not in settings:
+        return False
+    return settings[group_str].get('backup_hash') != group_settings_fingerprint(group_str)
+
+def compress_backup_lines(lines: List[str]) -> bytes:
+    """ضغط أسطر النسخة الاحتياطية (JSON Lines) في الذاكرة"""
+    buffer = io.BytesIO()
+    with gzip.GzipFile(fileobj=buffer, mode='wb', compresslevel=BACKUP_COMPRESSION_LEVEL, mtime=0) as gz:
+        for line in lines:
+            gz.write(line.encode('utf-8'))
+            gz.write(b'\n')
+    return buffer.getvalue()
+
+async def create_groups_backup(group_ids: List[int], manual: bool = False, incremental: bool = False) -> bool:
+    """إنشاء نسخة احتياطية مضغوطة لمجموعة أو أكثر ورفعها من الذاكرة"""
     try:
-        group_str = str(group_id)
-        if group_str not in settings:
+        targets = [gid for gid in group_ids if str(gid) in settings]
+        if not targets:
+            # المجموعة غير محملة في هذه العملية (مثل العملية الأمامية في وضع العمليات المتعددة)
+            logger.warning(f"لا توجد إعدادات للمجموعات المطلوبة للنسخ: {group_ids}")
             return False
+        if incremental:
+            # النسخ التزايدي: المجموعات التي تغيرت منذ آخر نسخة فقط
+            targets = [gid for gid in targets if group_changed_since_backup(str(gid))]
         
-        backup_data = {
-            'group_id': group_id,
-            'group_name': (await bot.get_chat(group_id)).title,
-            'settings': settings[group_str],
-            'timestamp': time.time(),
+        if not targets:
+            logger.info("لا توجد تغييرات تستدعي نسخة احتياطية")
+            return True
+        
+        group_names = {}
+        for gid in targets:
+            try:
+                group_names[gid] = await get_chat_title(gid)
+            except Exception:
+                group_names[gid] = f"Group {gid}"
+        
+        timestamp = time.time()
+        header = {
+            'type': 'header',
             'version': VERSION,
-            'type': 'manual' if manual else 'auto'
+            'timestamp': timestamp,
+            'kind': 'manual' if manual else 'auto',
+            'incremental': incremental,
+            'groups_count': len(targets)
         }
         
-        filename = f"backup_{group_id}_{int(time.time())}.json"
-        with open(filename, 'w', encoding='utf-8') as f:
-            json.dump(backup_data, f, ensure_ascii=False, indent=2)
+        # لقطة متزامنة للإعدادات قبل تمريرها للضغط خارج حلقة الأحداث
+        lines = [json.dumps(header, ensure_ascii=False)]
+        fingerprints = {}
+        keywords_count = 0
+        for gid in targets:
+            group_str = str(gid)
+            fingerprints[group_str] = group_settings_fingerprint(group_str)
+            keywords_count += len(settings[group_str].get('banned_keywords', []))
+            lines.append(json.dumps({
+                'type': 'group',
+                'group_id': gid,
+                'group_name': group_names[gid],
+                'settings': settings[group_str]
+            }, ensure_ascii=False, default=str))
+        
+        compress_started = time.perf_counter()
+        payload = await asyncio.to_thread(compress_backup_lines, lines)
+        persistence_flush_duration.observe(time.perf_counter() - compress_started, ("backup_compress",))
+        
+        label = targets[0] if len(targets) == 1 else 'all'
+        filename = f"backup_{label}_{int(timestamp)}.jsonl.gz"
+        title = group_names[targets[0]] if len(targets) == 1 else f"{len(targets)} مجموعات"
         
-        # إرسال الملف
-        with open(filename, 'rb') as f:
+        with outbound_priority(OutboundPriority.REPORT):
             await bot.send_document(
                 chat_id=DEVELOPER_ID,
-                document=FSInputFile(f, filename=filename),
-                caption=f"📦 نسخة احتياطية للمجموعة {backup_data['group_name']}\n"
-                       f"⏰ {datetime.fromtimestamp(backup_data['timestamp']).strftime('%Y-%m-%d %H:%M:%S')}\n"
-                       f"📊 {len(backup_data['settings'].get('banned_keywords', []))} كلمة ممنوعة"
+                document=BufferedInputFile(payload, filename=filename),
+                caption=f"📦 نسخة احتياطية {'تزايدية ' if incremental else ''}للمجموعة {title}\n"
+                       f"⏰ {datetime.fromtimestamp(timestamp).strftime('%Y-%m-%d %H:%M:%S')}\n"
+                       f"📊 {keywords_count} كلمة ممنوعة | 🗜️ {len(payload) / 1024:.1f} KB"
             )
         
-        # تحديث وقت آخر نسخة
-        settings[group_str]['last_backup'] = time.time()
-        await save_settings()
-        
-        # حذف الملف المحلي
-        os.remove(filename)
+        # تحديث وقت وبصمة آخر نسخة
+        for group_str, fingerprint in fingerprints.items():
+            settings[group_str]['last_backup'] = timestamp
+            settings[group_str]['backup_hash'] = fingerprint
+        await save_settings(*fingerprints)
         
-        logger.info(f"تم إنشاء نسخة احتياطية للمجموعة {group_id}")
+        logger.info(f"تم إنشاء نسخة احتياطية لـ {len(targets)} مجموعة ({len(payload)} بايت)")
         return True
     except Exception as e:
         logger.error(f"خطأ في إنشاء النسخة الاحتياطية: {e}")
         return False
 
+async def create_backup(group_id: int, manual: bool = False, incremental: bool = False):
+    """إنشاء نسخة احتياطية"""
+    return await create_groups_backup([group_id], manual=manual, incremental=incremental)
+
+# ================== نظام الاستعادة ==================
+RESTORE_API_KEY = os.getenv("RESTORE_API_KEY", "")  # مفتاح واجهة الاستعادة (فارغ = معطلة)
+RESTORE_CHUNK_SIZE = 65536
+
+# مخطط إعدادات المجموعة: المفتاح -> الأنواع المسموحة
+SETTINGS_SCHEMA = {
+    'mode': (str,),
+    'mute_duration': (int,),
+    'ban_duration': (int,),
+    'violations': (dict,),
+    'warnings': (dict,),
+    'banned_keywords': (list,),
+    'banned_links': (list,),
+    'banned_countries': (list,),
+    'exempted_users': (list,),
+    'vip_users': (list,),
+    'trusted_users': (list,),
+    'night_mode_enabled': (bool,),
+    'night_start': (str,),
+    'night_end': (str,),
+    'night_announce_msg_id': (int, type(None)),
+    'applicants_system': (bool,),
+    'auto_backup': (bool,),
+    'weekly_reports': (bool,),
+    'challenges_enabled': (bool,),
+    'country_detection_enabled': (bool,),
+    'keep_notification': (bool,),
+    'notification_duration': (int,),
+    'welcome_message': (str,),
+    'rules': (str,),
+    'custom_commands': (dict,),
+    'auto_replies': (dict,),
+    'exact_active_users': (bool,),
+    'applicants': (list,),
+    'last_backup': (int, float),
+    'last_weekly_report': (str,),
+    'last_update': (int, float),
+    'backup_hash': (str, type(None)),
+    'created_at': (int, float),
+    'owner_id': (int, type(None))
+}
+
+# أنواع عناصر القوائم
+SETTINGS_LIST_ITEM_TYPES = {
+    'banned_keywords': str,
+    'banned_links': str,
+    'banned_countries': str,
+    'exempted_users': int,
+    'vip_users': int,
+    'trusted_users': int,
+    'applicants': dict
+}
+
+# سجلات تستخدم معرف المستخدم كمفتاح
+SETTINGS_USER_KEYED = ('violations', 'warnings')
+
+def validate_group_settings(raw: Any) -> Tuple[Dict[str, Any], List[str]]:
+    """التحقق من إعدادات مجموعة مستعادة مقابل المخطط"""
+    errors = []
+    validated = {}
+    
+    if not isinstance(raw, dict):
+        return validated, ["الإعدادات ليست كائناً"]
+    
+    for key, value in raw.items():
+        expected = SETTINGS_SCHEMA.get(key)
+        if expected is None:
+            # مفاتيح غير معروفة يتم تجاهلها
+            continue
+        
+        # bool فرع من int في بايثون، لذلك يتم رفضه صراحة في الحقول الرقمية
+        if isinstance(value, bool) and bool not in expected:
+            errors.append(f"{key}: نوع غير صالح")
+            continue
+        if not isinstance(value, expected):
+            errors.append(f"{key}: نوع غير صالح")
+            continue
+        
+        item_type = SETTINGS_LIST_ITEM_TYPES.get(key)
+        if item_type is not None:
+            bad_items = sum(
+                1 for item in value
+                if not isinstance(item, item_type) or (item_type is int and isinstance(item, bool))
+            )
+            if bad_items:
+                errors.append(f"{key}: {bad_items} عنصر غير صالح")
+                continue
+        
+        if key in SETTINGS_USER_KEYED:
+            # مفاتيح JSON نصية دائماً، وباقي الكود يستخدم أرقام المستخدمين
+            value = {
+                int(user_id) if isinstance(user_id, str) and user_id.lstrip('-').isdigit() else user_id: count
+                for user_id, count in value.items()
+            }
+        
+        if key in ('night_start', 'night_end'):
+            try:
+                datetime.strptime(value, '%H:%M')
+            except ValueError:
+                errors.append(f"{key}: وقت غير صالح")
+                continue
+        
+        validated[key] = value
+    
+    return validated, errors
+
+async def decompress_backup_stream(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """فك ضغط النسخة الاحتياطية تدريجياً (gzip أو نص عادي)"""
+    decompressor = None
+    first = True
+    
+    async for chunk in chunks:
+        if not chunk:
+            continue
+        if first:
+            first = False
+            if chunk[:2] == b'\x1f\x8b':
+                decompressor = zlib.decompressobj(wbits=47)
+        
+        if decompressor is not None:
+            data = decompressor.decompress(chunk)
+            if data:
+                yield data
+        else:
+            yield chunk
+    
+    if decompressor is not None:
+        tail = decompressor.flush()
+        if tail:
+            yield tail
+        if not decompressor.eof:
+            raise ValueError("النسخة الاحتياطية مقطوعة")
+
+async def iter_backup_records(chunks: AsyncIterator[bytes]) -> AsyncIterator[Dict[str, Any]]:
+    """قراءة سجلات النسخة الاحتياطية سطراً بسطر دون تحميل الملف كاملاً"""
+    buffer = bytearray()
+    scanned = 0  # ما سبق فحصه من السطر غير المكتمل، حتى لا يُعاد البحث فيه مع كل جزء
+    legacy_parts = None  # النسخ القديمة: ملف JSON منسق واحد
+    
+    async for data in decompress_backup_stream(chunks):
+        if legacy_parts is not None:
+            legacy_parts.append(data)
+            continue
+        
+        buffer += data
+        start = 0
+        while True:
+            end = buffer.find(b'\n', max(start, scanned))
+            if end < 0:
+                break
+            line = bytes(buffer[start:end]).strip()
+            start = end + 1
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                if line == b'{':
+                    legacy_parts = [b'{\n', bytes(buffer[start:])]
+                    break
+                raise ValueError("سطر غير صالح في النسخة الاحتياطية")
+        
+        if legacy_parts is not None:
+            buffer = bytearray()
+        else:
+            del buffer[:start]
+        scanned = len(buffer)
+    
+    if legacy_parts is not None:
+        legacy = json.loads(b''.join(legacy_parts))
+        yield {'type': 'header', 'version': legacy.get('version'), 'timestamp': legacy.get('timestamp'), 'legacy': True}
+        yield {'type': 'group', 'group_id': legacy.get('group_id'), 'settings': legacy.get('settings')}
+    elif buffer.strip():
+        yield json.loads(bytes(buffer))
+
+def apply_restored_group(group_str: str, validated: Dict[str, Any]):
+    """تطبيق إعدادات مستعادة على مجموعة بشكل ذري"""
+    current = settings.get(group_str, {})
+    restored = default_group_settings()
+    restored.update(validated)
+    
+    # القيم التشغيلية تبقى كما هي في النسخة الحالية
+    for key in BACKUP_VOLATILE_KEYS:
+        if key in current:
+            restored[key] = current[key]
+        else:
+            restored.pop(key, None)
+    
+    settings[group_str] = restored
+    touch_settings(group_str)
+
+async def restore_from_stream(chunks: AsyncIterator[bytes], only_groups: Optional[Set[int]] = None) -> Dict[str, Any]:
+    """استعادة إعدادات المجموعات من تدفق نسخة احتياطية"""
+    summary = {'restored': [], 'skipped': {}, 'invalid': {}, 'header': None}
+    # لا يُطبق شيء قبل قراءة التدفق كاملاً، فالخطأ في منتصفه لا يترك الإعدادات نصف مستعادة
+    staged: Dict[str, Dict[str, Any]] = {}
+    group_records = 0
+    
+    async for record in iter_backup_records(chunks):
+        record_type = record.get('type', 'group')
+        
+        if record_type == 'header':
+            summary['header'] = record
+            continue
+        if record_type != 'group':
+            continue
+        
+        group_records += 1
+        group_id = record.get('group_id')
+        if not isinstance(group_id, int) or isinstance(group_id, bool):
+            summary['invalid'][str(group_id)] = ["معرف مجموعة غير صالح"]
+            continue
+        
+        group_str = str(group_id)
+        if group_str not in settings or (only_groups is not None and group_id not in only_groups):
+            summary['skipped'][group_str] = "المجموعة غير مسجلة أو خارج النطاق"
+            continue
+        
+        validated, errors = validate_group_settings(record.get('settings'))
+        if errors:
+            summary['invalid'][group_str] = errors
+            continue
+        
+        staged[group_str] = validated
+    
+    # سجلات أقل من المعلن في الترويسة تعني ملفاً مقطوعاً
+    expected = (summary['header'] or {}).get('groups_count')
+    if isinstance(expected, int) and expected != group_records:
+        raise ValueError(f"عدد المجموعات {group_records} لا يطابق الترويسة ({expected})")
+    
+    for group_str, validated in staged.items():
+        apply_restored_group(group_str, validated)
+        summary['restored'].append(int(group_str))
+    
+    if summary['restored']:
+        await save_settings(*summary['restored'])
+    
+    logger.info(
+        f"استعادة: {len(summary['restored'])} مجموعة، "
+        f"{len(summary['invalid'])} غير صالحة، {len(summary['skipped'])} متجاهلة"
+    )
+    return summary
+
+async def restore_from_document(document: types.Document, only_groups: Optional[Set[int]] = None) -> Dict[str, Any]:
+    """استعادة الإعدادات من ملف مرسل عبر تيليجرام"""
+    file = await bot.get_file(document.file_id)
+    url = bot.session.api.file_url(bot.token, file.file_path)
+    chunks = bot.session.stream_content(url=url, timeout=120, chunk_size=RESTORE_CHUNK_SIZE)
+    return await restore_from_stream(chunks, only_groups)
+
+def format_restore_summary(summary: Dict[str, Any]) -> str:
+    """تنسيق نتيجة الاستعادة"""
+    text = (
+        f"♻️ <b>نتيجة الاستعادة</b>\n\n"
+        f"✅ تمت الاستعادة: {len(summary['restored'])} مجموعة\n"
+        f"⚠️ غير صالحة: {len(summary['invalid'])}\n"
+        f"⏭️ متجاهلة: {len(summary['skipped'])}"
+    )
+    for group_str, errors in list(summary['invalid'].items())[:5]:
+        text += f"\n\n❌ <code>{group_str}</code>: {'، '.join(errors[:3])}"
+    return text
+
+# ================== مراقبة موارد النظام ==================
+SYSTEM_SAMPLE_INTERVAL = float(os.getenv("SYSTEM_SAMPLE_INTERVAL", 5))
+SYSTEM_SAMPLES_KEPT = 720  # ساعة كاملة بفاصل 5 ثوانٍ
+
+class SystemSampler:
+    """جامع دوري لمؤشرات النظام في مخزن دائري"""
+    
+    def __init__(self, interval: float, size: int):
+        self.interval = interval
+        self.samples = deque(maxlen=size)
+        self._process = psutil.Process()
+        # القراءة الأولى لنسبة المعالج تكون صفراً دائماً
+        self._process.cpu_percent(None)
+        psutil.cpu_percent(None)
+    
+    def sample(self, loop_lag: float = 0.0) -> Dict[str, Any]:
+        """أخذ عينة جديدة من موارد العملية"""
+        with self._process.oneshot():
+            memory_mb = self._process.memory_info().rss / 1024 / 1024
+            process_cpu = self._process.cpu_percent(None)
+            try:
+                open_fds = self._process.num_fds()
+            except (AttributeError, psutil.Error):
+                open_fds = None
+        
+        current = {
+            'timestamp': time.time(),
+            'memory_mb': memory_mb,
+            'cpu_percent': psutil.cpu_percent(None),
+            'process_cpu_percent': process_cpu,
+            'loop_lag_ms': loop_lag * 1000,
+            'open_fds': open_fds
+        }
+        self.samples.append(current)
+        
+        # الإبقاء على الحقول القديمة لمن يقرأ bot_stats مباشرة
+        bot_stats['system']['memory_usage'] = memory_mb
+        bot_stats['system']['cpu_usage'] = current['cpu_percent']
+        bot_stats['system']['uptime'] = current['timestamp'] - bot_stats['start_time']
+        return current
+    
+    def latest(self) -> Dict[str, Any]:
+        """آخر عينة متاحة"""
+        if self.samples:
+            return self.samples[-1]
+        return {
+            'timestamp': 0, 'memory_mb': 0.0, 'cpu_percent': 0.0,
+            'process_cpu_percent': 0.0, 'loop_lag_ms': 0.0, 'open_fds': None
+        }
+    
+    async def run(self):
+        """حلقة أخذ العينات مع قياس تأخر حلقة الأحداث"""
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - started - self.interval)
+            try:
+                self.sample(lag)
+            except Exception as e:
+                logger.error(f"خطأ في جمع مؤشرات النظام: {e}")
+
+system_sampler = SystemSampler(SYSTEM_SAMPLE_INTERVAL, SYSTEM_SAMPLES_KEPT)
+
+metrics.register(MetricGauge(
+    "bot_process_memory_megabytes", "Resident memory from the latest system sample",
+    function=lambda: {(): system_sampler.latest()['memory_mb']}))
+metrics.register(MetricGauge(
+    "bot_event_loop_lag_seconds", "Event loop lag from the latest system sample",
+    function=lambda: {(): system_sampler.latest()['loop_lag_ms'] / 1000}))
+metrics.register(MetricGauge(
+    "bot_open_fds", "Open file descriptors from the latest system sample",
+    function=lambda: {(): system_sampler.latest()['open_fds']}))
+
+# ================== عدّ الأعضاء النشطين (HyperLogLog) ==================
+HLL_PRECISION = 10  # 1024 سجلاً لكل شريحة (خطأ معياري ~3.2%)
+HASH_MASK_64 = (1 << 64) - 1
+# نوافذ العد: الاسم -> (مدة الشريحة بالثواني، عدد الشرائح)
+ACTIVE_USER_WINDOWS = {
+    'hourly': (300, 12),
+    'daily': (3600, 24),
+    'weekly': (86400, 7)
+}
+EXACT_ACTIVE_USERS_LIMIT = 5000  # بعدها يعود العد الدقيق إلى التقديري
+
+def hash64(value: int) -> int:
+    """تجزئة 64 بت لمعرفات المستخدمين (splitmix64)"""
+    z = (value + 0x9E3779B97F4A7C15) & HASH_MASK_64
+    z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & HASH_MASK_64
+    z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & HASH_MASK_64
+    return z ^ (z >> 31)
+
+class HyperLogLog:
+    """عداد تقديري للقيم المميزة بذاكرة ثابتة وقابل للدمج"""
+    
+    __slots__ = ('p', 'm', 'registers')
+    _INVERSE_POWERS = [2.0 ** -r for r in range(66)]
+    
+    def __init__(self, p: int = HLL_PRECISION):
+        self.p = p
+        self.m = 1 << p
+        self.registers = bytearray(self.m)
+    
+    def add_hash(self, h: int):
+        """إضافة قيمة مجزأة مسبقاً"""
+        index = h >> (64 - self.p)
+        remaining = h & ((1 << (64 - self.p)) - 1)
+        rank = (64 - self.p) - remaining.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+    
+    def add(self, value: int):
+        """إضافة قيمة"""
+        self.add_hash(hash64(value))
+    
+    def merge(self, other: 'HyperLogLog'):
+        """دمج عداد آخر بنفس الدقة"""
+        if other.p != self.p:
+            raise ValueError("لا يمكن دمج عدادات بدقة مختلفة")
+        self.registers = bytearray(map(max, self.registers, other.registers))
+    
+    def clear(self):
+        """تصفير العداد"""
+        self.registers = bytearray(self.m)
+    
+    def count(self) -> int:
+        """العدد التقديري للقيم المميزة"""
+        m = self.m
+        alpha = 0.7213 / (1 + 1.079 / m)
+        powers = self._INVERSE_POWERS
+        estimate = alpha * m * m / sum(powers[r] for r in self.registers)
+        if estimate <= 2.5 * m:
+            zeros = self.registers.count(0)
+            if zeros:
+                # تصحيح النطاق الصغير (العد الخطي)
+                estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+class RollingDistinctCounter:
+    """نافذة متحركة من شرائح HyperLogLog"""
+    
+    def __init__(self, bucket_seconds: int, buckets: int):
+        self.bucket_seconds = bucket_seconds
+        self.buckets = buckets
+        self.slots: List[Optional[HyperLogLog]] = [None] * buckets
+        self.epochs = [-1] * buckets
+    
+    def add_hash(self, h: int, now: float):
+        """إضافة قيمة إلى الشريحة الحالية"""
+        epoch = int(now // self.bucket_seconds)
+        slot = epoch % self.buckets
+        if self.epochs[slot] != epoch:
+            if self.slots[slot] is None:
+                self.slots[slot] = HyperLogLog()
+            else:
+                self.slots[slot].clear()
+            self.epochs[slot] = epoch
+        self.slots[slot].add_hash(h)
+    
+    def sketch(self, now: float) -> HyperLogLog:
+        """دمج الشرائح الحية في عداد واحد"""
+        current = int(now // self.bucket_seconds)
+        merged = HyperLogLog()
+        for slot, epoch in zip(self.slots, self.epochs):
+            if slot is not None and 0 <= current - epoch < self.buckets:
+                merged.merge(slot)
+        return merged
+    
+    def count(self, now: float) -> int:
+        """عدد القيم المميزة داخل النافذة"""
+        return self.sketch(now).count()
+
+class ActiveUsersTracker:
+    """تتبع الأعضاء النشطين لمجموعة عبر نوافذ زمنية متحركة"""
+    
+    def __init__(self):
+        self.windows = {
+            name: RollingDistinctCounter(bucket_seconds, buckets)
+            for name, (bucket_seconds, buckets) in ACTIVE_USER_WINDOWS.items()
+        }
+        self.exact: Optional[Dict[int, float]] = None
+    
+    def add(self, user_id: int, now: Optional[float] = None, exact: bool = False):
+        """تسجيل نشاط عضو"""
+        now = now or time.time()
+        h = hash64(user_id)
+        for window in self.windows.values():
+            window.add_hash(h, now)
+        
+        if exact:
+            if self.exact is None:
+                self.exact = {}
+            if user_id in self.exact or len(self.exact) < EXACT_ACTIVE_USERS_LIMIT:
+                self.exact[user_id] = now
+        elif self.exact is not None:
+            self.exact = None
+    
+    def window_span(self, window: str) -> int:
+        """مدة النافذة بالثواني"""
+        bucket_seconds, buckets = ACTIVE_USER_WINDOWS[window]
+        return bucket_seconds * buckets
+    
+    def count(self, window: str = 'daily', now: Optional[float] = None) -> int:
+        """عدد الأعضاء النشطين خلال النافذة"""
+        now = now or time.time()
+        if self.exact is not None and len(self.exact) < EXACT_ACTIVE_USERS_LIMIT:
+            since = now - self.window_span(window)
+            return sum(1 for seen in self.exact.values() if seen >= since)
+        return self.windows[window].count(now)
+    
+    def sketch(self, window: str = 'daily', now: Optional[float] = None) -> HyperLogLog:
+        """عداد النافذة القابل للدمج مع مجموعات أخرى"""
+        return self.windows[window].sketch(now or time.time())
+    
+    def trim(self, now: Optional[float] = None):
+        """حذف السجلات الدقيقة الأقدم من أطول نافذة"""
+        if self.exact is None:
+            return
+        since = (now or time.time()) - max(self.window_span(w) for w in self.windows)
+        self.exact = {user_id: seen for user_id, seen in self.exact.items() if seen >= since}
+
+def get_active_users_count(group_stats: Dict, window: str = 'daily') -> int:
+    """عدد الأعضاء النشطين لمجموعة خلال نافذة"""
+    tracker = group_stats.get('active_users')
+    return tracker.count(window) if tracker else 0
+
+def global_active_users(window: str = 'daily') -> int:
+    """عدد الأعضاء النشطين المميزين عبر كل المجموعات"""
+    now = time.time()
+    merged = HyperLogLog()
+    for group_stats in bot_stats['groups'].values():
+        tracker = group_stats.get('active_users')
+        if tracker:
+            merged.merge(tracker.sketch(window, now))
+    return merged.count()
+
+def serialize_group_stats(group_stats: Dict) -> Dict[str, Any]:
+    """تحويل إحصائيات المجموعة إلى صيغة JSON"""
+    data = {k: v for k, v in group_stats.items() if k not in ('active_users', 'top_violators')}
+    data['active_users'] = {window: get_active_users_count(group_stats, window) for window in ACTIVE_USER_WINDOWS}
+    violators = group_stats.get('top_violators')
+    data['top_violators'] = dict(violators.top(10)) if violators else {}
+    return data
+
+# ================== السلاسل الزمنية للإحصائيات ==================
+# الدقة: (الاسم، مدة الشريحة بالثواني، عدد الشرائح)
+TIMESERIES_RESOLUTIONS = (
+    ('minute', 60, 120),    # آخر ساعتين
+    ('hour', 3600, 168),    # آخر أسبوع
+    ('day', 86400, 90)      # آخر 90 يوماً
+)
+TIMESERIES_METRICS = ('messages', 'violations', 'bans', 'mutes', 'warnings', 'reports')
+GLOBAL_SERIES_KEY = '*'
+
+# ربط إجراءات update_stats بمقاييس السلاسل
+STATS_ACTION_METRICS = {
+    'message': 'messages',
+    'violation': 'violations',
+    'ban': 'bans',
+    'mute': 'mutes',
+    'warning': 'warnings',
+    'report': 'reports'
+}
+
+class RingSeries:
+    """مخزن دائري لعدادات بفواصل زمنية ثابتة"""
+    
+    __slots__ = ('bucket_seconds', 'size', 'counts', 'epochs')
+    
+    def __init__(self, bucket_seconds: int, size: int):
+        self.bucket_seconds = bucket_seconds
+        self.size = size
+        self.counts = [0] * size
+        self.epochs = [-1] * size
+    
+    @property
+    def span(self) -> int:
+        """المدة التي يغطيها المخزن بالثواني"""
+        return self.bucket_seconds * self.size
+    
+    def add(self, now: float, value: int = 1):
+        """إضافة قيمة إلى الشريحة الحالية"""
+        epoch = int(now // self.bucket_seconds)
+        slot = epoch % self.size
+        if self.epochs[slot] != epoch:
+            if self.epochs[slot] > epoch:
+                # قيمة أقدم من مدى المخزن
+                return
+            self.epochs[slot] = epoch
+            self.counts[slot] = 0
+        self.counts[slot] += value
+    
+    def points(self, buckets: int, now: float) -> List[int]:
+        """قيم آخر N شريحة من الأقدم إلى الأحدث"""
+        current = int(now // self.bucket_seconds)
+        buckets = min(buckets, self.size)
+        values = []
+        for epoch in range(current - buckets + 1, current + 1):
+            slot = epoch % self.size
+            values.append(self.counts[slot] if self.epochs[slot] == epoch else 0)
+        return values
+    
+    def total(self, seconds: float, now: float) -> int:
+        """مجموع القيم خلال آخر مدة محددة"""
+        buckets = max(1, math.ceil(seconds / self.bucket_seconds))
+        return sum(self.points(buckets, now))
+
+class TimeSeriesStore:
+    """مخزن السلاسل الزمنية لكل مجموعة ومقياس بعدة دقات"""
+    
+    def __init__(self):
+        self.series: Dict[Tuple[str, str], Tuple[RingSeries, ...]] = {}
+    
+    def _get(self, group_str: str, metric: str) -> Tuple[RingSeries, ...]:
+        key = (group_str, metric)
+        rollups = self.series.get(key)
+        if rollups is None:
+            rollups = tuple(RingSeries(seconds, size) for _, seconds, size in TIMESERIES_RESOLUTIONS)
+            self.series[key] = rollups
+        return rollups
+    
+    def record(self, group_str: str, metric: str, value: int = 1, now: Optional[float] = None):
+        """تسجيل قيمة للمجموعة وللإجمالي العام"""
+        now = now or time.time()
+        for key in (group_str, GLOBAL_SERIES_KEY):
+            for series in self._get(key, metric):
+                series.add(now, value)
+    
+    def total(self, group_str: str, metric: str, seconds: float, now: Optional[float] = None,
+              offset: float = 0, horizon: Optional[float] = None) -> int:
+        """مجموع المقياس لمدة تنتهي قبل offset ثانية باستخدام أدق دقة تغطي horizon"""
+        rollups = self.series.get((group_str, metric))
+        if rollups is None:
+            return 0
+        now = now or time.time()
+        # النوافذ المتقارنة تمرر الأفق نفسه لتُحسب بالدقة نفسها
+        horizon = max(horizon or 0, seconds + offset)
+        for series in rollups:
+            if horizon <= series.span:
+                return series.total(seconds, now - offset)
+        return rollups[-1].total(rollups[-1].span, now - offset)
+    
+    def totals(self, group_str: str, seconds: float, now: Optional[float] = None,
+               offset: float = 0, horizon: Optional[float] = None) -> Dict[str, int]:
+        """مجاميع كل المقاييس خلال مدة محددة"""
+        now = now or time.time()
+        return {metric: self.total(group_str, metric, seconds, now, offset, horizon) for metric in TIMESERIES_METRICS}
+    
+    def last_days(self, group_str: str, days: int, now: Optional[float] = None) -> Dict[str, int]:
+        """مجاميع آخر N يوم"""
+        return self.totals(group_str, days * 86400, now)
+
+stats_series = TimeSeriesStore()
+
+# ================== أكثر الأعضاء مخالفة (Top-K) ==================
+TOP_VIOLATORS_CAPACITY = 50  # عدد العدادات المحفوظة لكل ملخص
+TOP_VIOLATORS_DAYS = 7       # الأيام المحفوظة للنوافذ المتحركة
+
+class SpaceSaving:
+    """ملخص Space-Saving لأكثر العناصر تكراراً بذاكرة محدودة"""
+    
+    def __init__(self, capacity: int = TOP_VIOLATORS_CAPACITY):
+        self.capacity = capacity
+        self.counts: Dict[int, int] = {}
+        self.errors: Dict[int, int] = {}
+        self._heap: List[Tuple[int, int]] = []  # (العدد، المفتاح) مع إدخالات قديمة تُهمل عند السحب
+    
+    def _compact(self):
+        """إعادة بناء الكومة عند تراكم الإدخالات القديمة"""
+        self._heap = [(count, key) for key, count in self.counts.items()]
+        heapq.heapify(self._heap)
+    
+    def add(self, key: int, value: int = 1):
+        """زيادة عداد عنصر بتكلفة O(log k)"""
+        counts = self.counts
+        if key in counts:
+            counts[key] += value
+        elif len(counts) < self.capacity:
+            counts[key] = value
+            self.errors[key] = 0
+        else:
+            # استبدال العنصر الأقل عدداً
+            while True:
+                min_count, min_key = heapq.heappop(self._heap)
+                if counts.get(min_key) == min_count:
+                    break
+            del counts[min_key]
+            del self.errors[min_key]
+            counts[key] = min_count + value
+            self.errors[key] = min_count
+        
+        heapq.heappush(self._heap, (counts[key], key))
+        if len(self._heap) > 4 * self.capacity:
+            self._compact()
+    
+    def guaranteed(self) -> Dict[int, int]:
+        """الحد الأدنى المضمون لكل عنصر (العدد ناقص الخطأ الموروث عند الاستبدال)"""
+        errors = self.errors
+        return {key: count - errors[key] for key, count in self.counts.items() if count > errors[key]}
+    
+    def top(self, n: int) -> List[Tuple[int, int]]:
+        """أعلى N عنصر بأعدادها المضمونة، فلا يتصدر العابرون بأعداد موروثة"""
+        return heapq.nlargest(n, self.guaranteed().items(), key=lambda item: item[1])
+
+class ViolatorsTracker:
+    """تتبع أكثر الأعضاء مخالفة إجمالاً وعبر الأيام الأخيرة"""
+    
+    def __init__(self):
+        self.lifetime = SpaceSaving()
+        self.daily: List[Optional[SpaceSaving]] = [None] * TOP_VIOLATORS_DAYS
+        self.epochs = [-1] * TOP_VIOLATORS_DAYS
+    
+    def add(self, user_id: int, now: Optional[float] = None):
+        """تسجيل مخالفة لعضو"""
+        epoch = int((now or time.time()) // 86400)
+        slot = epoch % TOP_VIOLATORS_DAYS
+        self.lifetime.add(user_id)
+        if self.epochs[slot] > epoch:
+            # أقدم من النافذة المحفوظة
+            return
+        if self.epochs[slot] != epoch:
+            self.daily[slot] = SpaceSaving()
+            self.epochs[slot] = epoch
+        self.daily[slot].add(user_id)
+    
+    def top(self, n: int = 5, days: Optional[int] = None, now: Optional[float] = None) -> List[Tuple[int, int]]:
+        """أعلى N مخالف إجمالاً أو خلال آخر عدد من الأيام"""
+        if days is None:
+            return self.lifetime.top(n)
+        
+        current = int((now or time.time()) // 86400)
+        totals: Dict[int, int] = defaultdict(int)
+        for sketch, epoch in zip(self.daily, self.epochs):
+            if sketch is not None and 0 <= current - epoch < min(days, TOP_VIOLATORS_DAYS):
+                for user_id, count in sketch.guaranteed().items():
+                    totals[user_id] += count
+        return heapq.nlargest(n, totals.items(), key=lambda item: item[1])
+
 # ================== نظام الإحصائيات المتقدم ==================
 async def update_stats(group_id: int, action: str, user_id: int = None):
     """تحديث الإحصائيات"""
@@ -635,27 +2441,32 @@ async def update_stats(group_id: int, action: str, user_id: int = None):
                 'violations': 0, 'bans': 0, 'mutes': 0,
                 'warnings': 0, 'kicks': 0, 'reports': 0,
                 'messages_checked': 0, 'last_activity': time.time(),
-                'active_users': set(), 'top_violators': {}
+                'active_users': ActiveUsersTracker(), 'top_violators': ViolatorsTracker()
             }
         
         group_stats = bot_stats['groups'][group_str]
         
+        metric = STATS_ACTION_METRICS.get(action)
+        if metric:
+            stats_series.record(group_str, metric)
+        
         # تحديث الإحصائيات العامة
         if action == 'message':
             bot_stats['total_messages_checked'] += 1
             group_stats['messages_checked'] += 1
             
             if user_id:
-                group_stats['active_users'].add(user_id)
+                group_stats['active_users'].add(
+                    user_id,
+                    exact=settings.get(group_str, {}).get('exact_active_users', False)
+                )
                 
         elif action == 'violation':
             bot_stats['total_violations'] += 1
             group_stats['violations'] += 1
             
             if user_id:
-                if user_id not in group_stats['top_violators']:
-                    group_stats['top_violators'][user_id] = 0
-                group_stats['top_violators'][user_id] += 1
+                group_stats['top_violators'].add(user_id)
                 
         elif action == 'ban':
             bot_stats['total_bans'] += 1
@@ -676,11 +2487,6 @@ async def update_stats(group_id: int, action: str, user_id: int = None):
         # تحديث وقت النشاط
         group_stats['last_activity'] = time.time()
         
-        # تحديث إحصائيات النظام
-        bot_stats['system']['memory_usage'] = psutil.Process().memory_info().rss / 1024 / 1024
-        bot_stats['system']['cpu_usage'] = psutil.cpu_percent()
-        bot_stats['system']['uptime'] = time.time() - bot_stats['start_time']
-        
         # حفظ الإحصائيات كل 100 تحديث
         if bot_stats['total_messages_checked'] % 100 == 0:
             await save_stats()
@@ -691,25 +2497,29 @@ async def update_stats(group_id: int, action: str, user_id: int = None):
 async def save_stats():
     """حفظ الإحصائيات"""
     global STATS_MESSAGE_ID
+    started = time.perf_counter()
     try:
         stats_text = generate_stats_report()
         
-        if STATS_MESSAGE_ID:
-            try:
-                await bot.edit_message_text(
-                    chat_id=DB_CHAT_ID,
-                    message_id=STATS_MESSAGE_ID,
-                    text=stats_text
-                )
-            except:
+        with outbound_priority(OutboundPriority.REPORT):
+            if STATS_MESSAGE_ID:
+                try:
+                    await bot.edit_message_text(
+                        chat_id=DB_CHAT_ID,
+                        message_id=STATS_MESSAGE_ID,
+                        text=stats_text
+                    )
+                except:
+                    msg = await bot.send_message(DB_CHAT_ID, stats_text)
+                    STATS_MESSAGE_ID = msg.message_id
+            else:
                 msg = await bot.send_message(DB_CHAT_ID, stats_text)
                 STATS_MESSAGE_ID = msg.message_id
-        else:
-            msg = await bot.send_message(DB_CHAT_ID, stats_text)
-            STATS_MESSAGE_ID = msg.message_id
             
     except Exception as e:
         logger.error(f"خطأ في حفظ الإحصائيات: {e}")
+    finally:
+        persistence_flush_duration.observe(time.perf_counter() - started, ("stats",))
 
 def generate_stats_report() -> str:
     """توليد تقرير الإحصائيات"""
@@ -717,6 +2527,7 @@ def generate_stats_report() -> str:
     days = int(uptime // 86400)
     hours = int((uptime % 86400) // 3600)
     minutes = int((uptime % 3600) // 60)
+    system = system_sampler.latest()
     
     report = f"""📊 تقرير إحصائيات الحارس الأمني المتقدم
 🕐 الإصدار: {VERSION} | تاريخ الإصدار: {RELEASE_DATE}
@@ -731,8 +2542,9 @@ def generate_stats_report() -> str:
 └ 📋 التقارير: {format_number(bot_stats['total_reports'])}
 
 💻 إحصائيات النظام:
-├ 🧠 استخدام الذاكرة: {bot_stats['system']['memory_usage']:.1f} MB
-├ ⚡ استخدام المعالج: {bot_stats['system']['cpu_usage']:.1f}%
+├ 🧠 استخدام الذاكرة: {system['memory_mb']:.1f} MB
+├ ⚡ استخدام المعالج: {system['cpu_percent']:.1f}%
+├ ⏱️ تأخر حلقة الأحداث: {system['loop_lag_ms']:.1f} ms
 └ 👥 المجموعات النشطة: {len(bot_stats['groups'])}
 
 🏆 المجموعات الأكثر نشاطاً:"""
@@ -745,16 +2557,12 @@ def generate_stats_report() -> str:
     )[:5]
     
     for i, (group_id, stats) in enumerate(sorted_groups, 1):
-        try:
-            chat = bot.get_chat(int(group_id))
-            group_name = chat.title if hasattr(chat, 'title') else f"Group {group_id}"
-        except:
-            group_name = f"Group {group_id}"
+        group_name = peek_chat_title(int(group_id), f"Group {group_id}")
         
         report += f"\n{i}. {group_name[:20]}"
         report += f"\n   ├ 📨 {format_number(stats['messages_checked'])}"
         report += f"\n   ├ ⚠️ {stats['violations']}"
-        report += f"\n   └ 👥 {len(stats.get('active_users', set()))}"
+        report += f"\n   └ 👥 {get_active_users_count(stats)}"
     
     report += f"\n\n📅 آخر تحديث: {get_formatted_time()}"
     report += f"\n{get_random_emoji()} البوت يعمل بكفاءة عالية!"
@@ -762,6 +2570,55 @@ def generate_stats_report() -> str:
     return report
 
 # ================== نظام المعاقبة المتقدم ==================
+VIOLATION_NOTICE_MAX_LINES = 15  # أسطر الملخص عند دمج عدة إشعارات
+
+violation_notices_coalesced = metrics.register(MetricCounter(
+    "bot_violation_notices_coalesced_total", "Violation notices merged into a summary message"))
+
+class ViolationNotifier:
+    """إرسال إشعارات المخالفات خارج معالج التحديث، مع دمج المتراكم منها في رسالة واحدة"""
+    
+    def __init__(self):
+        self.pending: Dict[int, List[Tuple[str, str]]] = {}
+        self.delete_after: Dict[int, Optional[float]] = {}
+        self.senders: Dict[int, asyncio.Task] = {}
+    
+    def notify(self, chat_id: int, text: str, line: str, delete_after: Optional[float]):
+        """إضافة إشعار دون انتظار؛ حد الإرسال للمحادثة ينتظر في مهمة المرسل وحدها"""
+        self.pending.setdefault(chat_id, []).append((text, line))
+        self.delete_after[chat_id] = delete_after
+        if chat_id not in self.senders:
+            self.senders[chat_id] = spawn_background(self._drain(chat_id), "إشعارات المخالفات")
+    
+    def _compose(self, batch: List[Tuple[str, str]]) -> str:
+        if len(batch) == 1:
+            return batch[0][0]
+        violation_notices_coalesced.inc(len(batch))
+        lines = [line for _, line in batch[-VIOLATION_NOTICE_MAX_LINES:]]
+        hidden = len(batch) - len(lines)
+        text = f"🛡️ <b>{len(batch)} إجراء أمني</b>\n\n" + "\n".join(lines)
+        if hidden:
+            text += f"\n… و{hidden} إجراء آخر"
+        return text + "\n\n🛡️ <i>المجموعة محمية بواسطة الحارس الأمني المتقدم</i>"
+    
+    async def _drain(self, chat_id: int):
+        try:
+            while self.pending.get(chat_id):
+                # ما تراكم أثناء انتظار حد الإرسال يخرج في رسالة واحدة
+                batch = self.pending.pop(chat_id)
+                try:
+                    msg = await bot.send_message(chat_id, self._compose(batch))
+                    delete_after = self.delete_after.get(chat_id)
+                    if delete_after is not None:
+                        delayed_actions.schedule(chat_id, 'delete_message', delete_after, message_id=msg.message_id)
+                except Exception as e:
+                    logger.error(f"خطأ في إرسال الإشعار: {e}")
+        finally:
+            self.senders.pop(chat_id, None)
+            self.delete_after.pop(chat_id, None)
+
+violation_notifier = ViolationNotifier()
+
 async def handle_violation(chat_id: int, user_id: int, message: Message, detection_result: Dict):
     """معالجة المخالفة"""
     group_str = str(chat_id)
@@ -815,24 +2672,21 @@ async def handle_violation(chat_id: int, user_id: int, message: Message, detecti
 🛡️ <i>المجموعة محمية بواسطة الحارس الأمني المتقدم</i>
 """
     
-    # إرسال الإشعار
-    if notification_text:
-        try:
-            msg = await bot.send_message(chat_id, notification_text)
-            
-            # حذف الإشعار بعد مدة إذا لم يكن دائم
-            if not group_settings.get('keep_notification', False):
-                duration = group_settings.get('notification_duration', 120)
-                await asyncio.sleep(duration)
-                await safe_delete_message(chat_id, msg.message_id)
-        except Exception as e:
-            logger.error(f"خطأ في إرسال الإشعار: {e}")
-    
     # حذف الرسالة الأصلية
     await safe_delete_message(chat_id, message.message_id)
     
+    # إرسال الإشعار في الخلفية، مع حذفه بعد مدة إذا لم يكن دائماً
+    delete_after = None
+    if not group_settings.get('keep_notification', False):
+        delete_after = group_settings.get('notification_duration', 120)
+    violation_notifier.notify(
+        chat_id, notification_text,
+        f"{action_emoji} {user_link}: {detection_result.get('reason', 'محتوى مخالف')}",
+        delete_after
+    )
+    
     # حفظ الإعدادات
-    await save_settings()
+    await save_settings(chat_id)
 
 async def apply_punishment(chat_id: int, user_id: int, mode: str, 
                           violations: int, detection_result: Dict, 
@@ -1010,11 +2864,63 @@ async def check_night_mode(group_str: str) -> bool:
     except:
         return False
 
+NIGHT_NOTICE_WINDOW = 60  # مدة بقاء تنبيه الوضع الليلي (ثوانٍ)
+NIGHT_NOTICE_EDIT_INTERVAL = 15  # أقل مدة بين تحديثات التنبيه
+
+def night_notice_text(group_str: str, blocked: int) -> str:
+    """نص تنبيه الوضع الليلي"""
+    text = (
+        f"🌙 <b>الوضع الليلي مفعل</b>\n\n"
+        f"⏰ الوقت الحالي: {datetime.now().strftime('%H:%M')}\n"
+        f"🚫 النشر متوقف حتى: {settings[group_str]['night_end']}\n\n"
+        f"💤 استريحوا وناموا جيداً!"
+    )
+    if blocked > 1:
+        text += f"\n\n🗑️ رسائل محذوفة: {blocked}"
+    return text
+
+class NightNoticeThrottle:
+    """تنبيه واحد للوضع الليلي لكل مجموعة خلال النافذة بدل تنبيه لكل رسالة"""
+    
+    def __init__(self):
+        self.notices: Dict[int, Dict[str, Any]] = {}
+    
+    async def notify(self, chat_id: int, group_str: str):
+        """إظهار أو تحديث تنبيه الوضع الليلي"""
+        now = time.time()
+        notice = self.notices.get(chat_id)
+        
+        if notice and now - notice['sent_at'] < NIGHT_NOTICE_WINDOW:
+            notice['blocked'] += 1
+            if notice['message_id'] and now - notice['edited_at'] >= NIGHT_NOTICE_EDIT_INTERVAL:
+                notice['edited_at'] = now
+                try:
+                    await bot.edit_message_text(
+                        night_notice_text(group_str, notice['blocked']),
+                        chat_id=chat_id,
+                        message_id=notice['message_id']
+                    )
+                except:
+                    pass
+            return
+        
+        # حجز الخانة قبل الإرسال حتى لا ترسل الرسائل المتزامنة تنبيهات مكررة
+        notice = {'message_id': None, 'sent_at': now, 'edited_at': now, 'blocked': 1}
+        self.notices[chat_id] = notice
+        try:
+            msg = await bot.send_message(chat_id, night_notice_text(group_str, 1))
+            notice['message_id'] = msg.message_id
+            delayed_actions.schedule(chat_id, 'delete_message', NIGHT_NOTICE_WINDOW, message_id=msg.message_id)
+        except Exception as e:
+            logger.error(f"خطأ في إرسال تنبيه الوضع الليلي: {e}")
+
+night_notices = NightNoticeThrottle()
+
 async def night_mode_checker():
     """مدقق الوضع الليلي"""
     while True:
         try:
-            for group_id in ALLOWED_GROUP_IDS:
+            for group_id in owned_group_ids():
                 group_str = str(group_id)
                 is_night = await check_night_mode(group_str)
                 
@@ -1031,7 +2937,7 @@ async def night_mode_checker():
                     try:
                         msg = await bot.send_message(group_id, announce_text)
                         settings[group_str]['night_announce_msg_id'] = msg.message_id
-                        await save_settings()
+                        await save_settings(group_str)
                     except:
                         pass
                         
@@ -1046,7 +2952,7 @@ async def night_mode_checker():
                         pass
                     finally:
                         settings[group_str]['night_announce_msg_id'] = None
-                        await save_settings()
+                        await save_settings(group_str)
                         
                         # إرسال إعلان انتهاء الوضع الليلي
                         morning_text = f"""☀️ <b>تم تعطيل الوضع الليلي</b>
@@ -1106,47 +3012,70 @@ async def handle_application(chat_id: int, user_id: int, message: Message):
     }
     
     settings[group_str]['applicants'].append(application)
-    await save_settings()
+    # حفظ الطلب قبل الإعلام حتى لا يضيع إذا توقف البوت أثناءه
+    await save_settings(chat_id)
     
-    # إعلام الإداريين
-    admins = await get_chat_admins(chat_id)
-    for admin in admins:
-        try:
-            keyboard = InlineKeyboardMarkup(inline_keyboard=[
-                [
-                    InlineKeyboardButton(text="✅ قبول", callback_data=f"accept_app_{user_id}_{chat_id}"),
-                    InlineKeyboardButton(text="❌ رفض", callback_data=f"reject_app_{user_id}_{chat_id}")
-                ],
-                [
-                    InlineKeyboardButton(text="💬 مقابلة", callback_data=f"interview_app_{user_id}_{chat_id}")
-                ]
-            ])
-            
-            await bot.send_message(
-                admin.user.id,
-                f"""📋 <b>طلب جديد للإدارة</b>
+    # الرد على المتقدم فوراً وإعلام الإداريين في الخلفية
+    await message.reply("✅ تم إرسال طلبك للإدارة، سنخبرك بالنتيجة قريباً")
+    spawn_background(notify_application_admins(application, message.chat.title), "إعلام الإداريين بطلب التقديم")
+
+APPLICATION_FANOUT_CONCURRENCY = 5
+
+async def notify_application_admins(application: Dict[str, Any], chat_title: str):
+    """إرسال طلب التقديم لجميع الإداريين بتوازٍ محدود"""
+    user_id = application['user_id']
+    chat_id = application['chat_id']
+    
+    keyboard = InlineKeyboardMarkup(inline_keyboard=[
+        [
+            InlineKeyboardButton(text="✅ قبول", callback_data=ApplicationCallback(action="accept", user_id=user_id, group_id=chat_id).pack()),
+            InlineKeyboardButton(text="❌ رفض", callback_data=ApplicationCallback(action="reject", user_id=user_id, group_id=chat_id).pack())
+        ],
+        [
+            InlineKeyboardButton(text="💬 مقابلة", callback_data=ApplicationCallback(action="interview", user_id=user_id, group_id=chat_id).pack())
+        ]
+    ])
+    text = f"""📋 <b>طلب جديد للإدارة</b>
 
 👤 المتقدم: {application['full_name']}
 📛 المعرف: @{application['username'] or 'لا يوجد'}
 🆔 الرقم: <code>{user_id}</code>
 📝 الرسالة: {application['message'][:200]}
 
-📌 المجموعة: {message.chat.title}
+📌 المجموعة: {chat_title}
 ⏰ الوقت: {datetime.fromtimestamp(application['timestamp']).strftime('%Y-%m-%d %H:%M:%S')}
 
-🛡️ اختر الإجراء المناسب:""",
-                reply_markup=keyboard
-            )
-        except:
-            continue
+🛡️ اختر الإجراء المناسب:"""
     
-    await message.reply("✅ تم إرسال طلبك للإدارة، سنخبرك بالنتيجة قريباً")
+    semaphore = asyncio.Semaphore(APPLICATION_FANOUT_CONCURRENCY)
+    
+    async def deliver(admin_id: int) -> Tuple[int, str]:
+        async with semaphore:
+            try:
+                await bot.send_message(admin_id, text, reply_markup=keyboard)
+                return admin_id, 'sent'
+            except Exception as e:
+                return admin_id, classify_delivery_error(e)
+    
+    admins = await get_chat_admins(chat_id)
+    results = await asyncio.gather(*(deliver(admin.user.id) for admin in admins))
+    
+    # نتائج التسليم تحفظ مع الطلب (مفاتيح نصية لتوافق JSON)
+    application['deliveries'] = {str(admin_id): status for admin_id, status in results}
+    delivered = sum(1 for _, status in results if status == 'sent')
+    logger.info(f"طلب تقديم {user_id} في {chat_id}: وصل لـ {delivered}/{len(results)} إداري")
+    await save_settings(chat_id)
 
 async def get_chat_admins(chat_id: int):
-    """الحصول على قائمة الإداريين"""
+    """الحصول على قائمة الإداريين (مع ذاكرة مؤقتة)"""
+    admins = chat_admins.get(chat_id)
+    if admins is not None:
+        return admins
     try:
         admins = await bot.get_chat_administrators(chat_id)
-        return [admin for admin in admins if not admin.user.is_bot]
+        admins = [admin for admin in admins if not admin.user.is_bot]
+        chat_admins.set(chat_id, admins)
+        return admins
     except Exception as e:
         logger.error(f"خطأ في جلب الإداريين: {e}")
         return []
@@ -1179,6 +3108,7 @@ async def check_custom_commands(chat_id: int, command: str) -> Optional[str]:
     return custom_commands.get(command)
 
 # ================== لوحات التحكم والواجهات ==================
+@cached_panel("main", stats=True)
 def get_main_control_panel(group_id: int) -> Tuple[str, InlineKeyboardMarkup]:
     """لوحة التحكم الرئيسية"""
     group_str = str(group_id)
@@ -1191,7 +3121,7 @@ def get_main_control_panel(group_id: int) -> Tuple[str, InlineKeyboardMarkup]:
     text = f"""🛡️ <b>لوحة تحكم الحارس الأمني المتقدم</b> {get_random_emoji()}
 
 📊 <b>إحصائيات المجموعة:</b>
-├ 👥 الأعضاء النشطين: {len(group_stats.get('active_users', set()))}
+├ 👥 الأعضاء النشطين اليوم: {get_active_users_count(group_stats)}
 ├ 📨 الرسائل المفحوصة: {format_number(group_stats.get('messages_checked', 0))}
 ├ ⚠️ المخالفات: {group_stats.get('violations', 0)}
 ├ 🚫 الحظور: {group_stats.get('bans', 0)}
@@ -1224,29 +3154,29 @@ def get_main_control_panel(group_id: int) -> Tuple[str, InlineKeyboardMarkup]:
     keyboard = InlineKeyboardBuilder()
     
     # قسم الحماية
-    keyboard.button(text="⚔️ الحماية الأساسية", callback_data=f"protection_{group_id}")
-    keyboard.button(text="🔤 الكلمات الممنوعة", callback_data=f"keywords_{group_id}")
-    keyboard.button(text="🔗 الروابط الممنوعة", callback_data=f"links_{group_id}")
+    keyboard.button(text="⚔️ الحماية الأساسية", callback_data=GroupCallback(action="protection", group_id=group_id).pack())
+    keyboard.button(text="🔤 الكلمات الممنوعة", callback_data=GroupCallback(action="keywords", group_id=group_id).pack())
+    keyboard.button(text="🔗 الروابط الممنوعة", callback_data=GroupCallback(action="links", group_id=group_id).pack())
     
     # قسم الإدارة
-    keyboard.button(text="👥 إدارة الأعضاء", callback_data=f"members_{group_id}")
-    keyboard.button(text="🌍 الدول المحظورة", callback_data=f"countries_{group_id}")
-    keyboard.button(text="🌙 الوضع الليلي", callback_data=f"night_{group_id}")
+    keyboard.button(text="👥 إدارة الأعضاء", callback_data=GroupCallback(action="members", group_id=group_id).pack())
+    keyboard.button(text="🌍 الدول المحظورة", callback_data=GroupCallback(action="countries", group_id=group_id).pack())
+    keyboard.button(text="🌙 الوضع الليلي", callback_data=GroupCallback(action="night", group_id=group_id).pack())
     
     # قسم المميزات
-    keyboard.button(text="🎪 المميزات الإضافية", callback_data=f"features_{group_id}")
-    keyboard.button(text="📊 الإحصائيات", callback_data=f"stats_{group_id}")
-    keyboard.button(text="⚙️ الإعدادات المتقدمة", callback_data=f"advanced_{group_id}")
+    keyboard.button(text="🎪 المميزات الإضافية", callback_data=GroupCallback(action="features", group_id=group_id).pack())
+    keyboard.button(text="📊 الإحصائيات", callback_data=GroupCallback(action="stats", group_id=group_id).pack())
+    keyboard.button(text="⚙️ الإعدادات المتقدمة", callback_data=GroupCallback(action="advanced", group_id=group_id).pack())
     
     # قسم الأوامر
-    keyboard.button(text="🤖 الأوامر المخصصة", callback_data=f"commands_{group_id}")
-    keyboard.button(text="💬 الردود التلقائية", callback_data=f"replies_{group_id}")
-    keyboard.button(text="📋 نظام التقديم", callback_data=f"applicants_{group_id}")
+    keyboard.button(text="🤖 الأوامر المخصصة", callback_data=GroupCallback(action="commands", group_id=group_id).pack())
+    keyboard.button(text="💬 الردود التلقائية", callback_data=GroupCallback(action="replies", group_id=group_id).pack())
+    keyboard.button(text="📋 نظام التقديم", callback_data=GroupCallback(action="applicants", group_id=group_id).pack())
     
     # أزرار المساعدة
-    keyboard.button(text="📚 الدليل الشامل", callback_data=f"guide_{group_id}")
+    keyboard.button(text="📚 الدليل الشامل", callback_data=GroupCallback(action="guide", group_id=group_id).pack())
     keyboard.button(text="💬 دعم فني", url=SUPPORT_CHAT)
-    keyboard.button(text="🔄 تحديث اللوحة", callback_data=f"refresh_{group_id}")
+    keyboard.button(text="🔄 تحديث اللوحة", callback_data=GroupCallback(action="refresh", group_id=group_id).pack())
     keyboard.button(text="🏠 القائمة الرئيسية", callback_data="main_menu")
     
     keyboard.adjust(3, 3, 3, 3, 2, 2)
@@ -1429,10 +3359,10 @@ async def settings_command(message: Message):
         for gid in ALLOWED_GROUP_IDS:
             try:
                 if await is_admin(gid, user_id):
-                    chat = await bot.get_chat(gid)
+                    title = await get_chat_title(gid)
                     keyboard.button(
-                        text=f"📌 {chat.title[:25]}",
-                        callback_data=f"manage_{gid}"
+                        text=f"📌 {title[:25]}",
+                        callback_data=GroupCallback(action="manage", group_id=gid).pack()
                     )
                     has_groups = True
             except:
@@ -1478,7 +3408,7 @@ async def stats_command(message: Message):
     group_settings = settings.get(group_str, {})
     
     # حساب بعض الإحصائيات
-    active_users = len(group_stats.get('active_users', set()))
+    active_users = get_active_users_count(group_stats)
     messages_checked = group_stats.get('messages_checked', 0)
     violations = group_stats.get('violations', 0)
     bans = group_stats.get('bans', 0)
@@ -1486,34 +3416,32 @@ async def stats_command(message: Message):
     
     # نسبة المخالفات
     violation_rate = (violations / messages_checked * 100) if messages_checked > 0 else 0
+    last_day = stats_series.last_days(group_str, 1)
     
     stats_text = f"""📊 <b>إحصائيات المجموعة</b> {get_random_emoji()}
 
 📈 <b>الإحصائيات العامة:</b>
-├ 👥 الأعضاء النشطين: {active_users}
+├ 👥 الأعضاء النشطين اليوم: {active_users}
 ├ 📨 الرسائل المفحوصة: {format_number(messages_checked)}
 ├ ⚠️ المخالفات المكتشفة: {violations}
 ├ 🚫 حالات الحظر: {bans}
 ├ 🔇 حالات الكتم: {mutes}
 └ 📊 نسبة المخالفات: {violation_rate:.2f}%
 
-🎯 <b>أكثر الأعضاء مخالفة:</b>"""
+🕐 <b>آخر 24 ساعة:</b>
+├ 📨 الرسائل: {format_number(last_day['messages'])}
+├ ⚠️ المخالفات: {last_day['violations']}
+└ 🚫 الحظر/الكتم: {last_day['bans']}/{last_day['mutes']}
+
+🎯 <b>أكثر الأعضاء مخالفة (آخر 7 أيام):</b>"""
     
     # عرض أكثر الأعضاء مخالفة
-    top_violators = sorted(
-        group_stats.get('top_violators', {}).items(),
-        key=lambda x: x[1],
-        reverse=True
-    )[:5]
+    violators = group_stats.get('top_violators')
+    top_violators = violators.top(5, days=TOP_VIOLATORS_DAYS) if violators else []
     
     if top_violators:
         for i, (user_id, count) in enumerate(top_violators, 1):
-            try:
-                user = await bot.get_chat_member(chat_id, user_id)
-                name = user.user.full_name
-            except:
-                name = f"مستخدم {user_id}"
-            
+            name = await get_user_name(chat_id, user_id)
             stats_text += f"\n{i}. {name[:20]} - {count} مخالفة"
     else:
         stats_text += "\nلا توجد مخالفات حتى الآن 👍"
@@ -1529,10 +3457,10 @@ async def stats_command(message: Message):
 🛡️ <b>الحارس الأمني يحميكم!</b>"""
     
     keyboard = InlineKeyboardBuilder()
-    keyboard.button(text="🔄 تحديث", callback_data=f"stats_refresh_{chat_id}")
-    keyboard.button(text="📈 تفاصيل أكثر", callback_data=f"stats_details_{chat_id}")
+    keyboard.button(text="🔄 تحديث", callback_data=GroupCallback(action="stats_refresh", group_id=chat_id).pack())
+    keyboard.button(text="📈 تفاصيل أكثر", callback_data=GroupCallback(action="stats_details", group_id=chat_id).pack())
     keyboard.button(text="📊 إحصائيات عالمية", callback_data="global_stats")
-    keyboard.button(text="🏠 القائمة الرئيسية", callback_data=f"manage_{chat_id}")
+    keyboard.button(text="🏠 القائمة الرئيسية", callback_data=GroupCallback(action="manage", group_id=chat_id).pack())
     
     keyboard.adjust(2, 2)
     
@@ -1570,6 +3498,41 @@ async def backup_command(message: Message):
             "⚠️ حاول مرة أخرى لاحقاً"
         )
 
+@dp.message(Command("restore"))
+async def restore_command(message: Message):
+    """استعادة الإعدادات من نسخة احتياطية"""
+    user_id = message.from_user.id
+    chat_id = message.chat.id
+    
+    # المطور يستعيد كل المجموعات، والمسؤول يستعيد مجموعته فقط
+    if user_id == DEVELOPER_ID and message.chat.type == 'private':
+        only_groups = None
+    elif chat_id in ALLOWED_GROUP_IDS and await is_admin(chat_id, user_id):
+        only_groups = {chat_id}
+    else:
+        await message.reply("❌ هذا الأمر للمسؤولين فقط")
+        return
+    
+    document = message.document
+    if document is None and message.reply_to_message:
+        document = message.reply_to_message.document
+    
+    if document is None:
+        await message.reply(
+            "📦 <b>أرسل ملف النسخة الاحتياطية مع الأمر</b> <code>/restore</code>\n"
+            "أو قم بالرد على الملف بالأمر."
+        )
+        return
+    
+    wait_msg = await message.reply("♻️ <b>جاري استعادة الإعدادات...</b>")
+    
+    try:
+        summary = await restore_from_document(document, only_groups)
+        await wait_msg.edit_text(format_restore_summary(summary))
+    except Exception as e:
+        logger.error(f"خطأ في الاستعادة: {e}")
+        await wait_msg.edit_text(f"❌ <b>فشلت الاستعادة:</b>\n\n{str(e)[:200]}")
+
 @dp.message(Command("scan"))
 async def scan_command(message: Message):
     """فحص المجموعة"""
@@ -1624,9 +3587,9 @@ async def scan_command(message: Message):
 🛡️ <b>المجموعة محمية بشكل جيد!</b>"""
         
         keyboard = InlineKeyboardBuilder()
-        keyboard.button(text="🔄 فحص أعمق", callback_data=f"deep_scan_{chat_id}")
-        keyboard.button(text="🧹 تنظيف تلقائي", callback_data=f"auto_clean_{chat_id}")
-        keyboard.button(text="📊 الإحصائيات", callback_data=f"stats_{chat_id}")
+        keyboard.button(text="🔄 فحص أعمق", callback_data=GroupCallback(action="deep_scan", group_id=chat_id).pack())
+        keyboard.button(text="🧹 تنظيف تلقائي", callback_data=GroupCallback(action="auto_clean", group_id=chat_id).pack())
+        keyboard.button(text="📊 الإحصائيات", callback_data=GroupCallback(action="stats", group_id=chat_id).pack())
         
         keyboard.adjust(1)
         
@@ -1650,11 +3613,11 @@ async def clean_command(message: Message):
         return
     
     keyboard = InlineKeyboardBuilder()
-    keyboard.button(text="🗑️ مسح روابط", callback_data=f"clean_links_{chat_id}")
-    keyboard.button(text="🔤 مسح كلمات", callback_data=f"clean_keywords_{chat_id}")
-    keyboard.button(text="👻 مسح حسابات", callback_data=f"clean_accounts_{chat_id}")
-    keyboard.button(text="🧹 تنظيف كامل", callback_data=f"clean_all_{chat_id}")
-    keyboard.button(text="↩️ رجوع", callback_data=f"manage_{chat_id}")
+    keyboard.button(text="🗑️ مسح روابط", callback_data=GroupCallback(action="clean_links", group_id=chat_id).pack())
+    keyboard.button(text="🔤 مسح كلمات", callback_data=GroupCallback(action="clean_keywords", group_id=chat_id).pack())
+    keyboard.button(text="👻 مسح حسابات", callback_data=GroupCallback(action="clean_accounts", group_id=chat_id).pack())
+    keyboard.button(text="🧹 تنظيف كامل", callback_data=GroupCallback(action="clean_all", group_id=chat_id).pack())
+    keyboard.button(text="↩️ رجوع", callback_data=GroupCallback(action="manage", group_id=chat_id).pack())
     
     keyboard.adjust(2, 2, 1)
     
@@ -1664,11 +3627,179 @@ async def clean_command(message: Message):
         reply_markup=keyboard.as_markup()
     )
 
+# ================== موجه الأزرار ==================
+class GroupCallback(CallbackData, prefix="g"):
+    """زر إجراء على مجموعة"""
+    action: str
+    group_id: int
+
+class ModeCallback(CallbackData, prefix="m"):
+    """زر اختيار وضع الحماية"""
+    mode: str
+    group_id: int
+
+class ApplicationCallback(CallbackData, prefix="a"):
+    """زر إجراء على طلب تقديم"""
+    action: str
+    user_id: int
+    group_id: int
+
+def _dev_only(handler: Callable) -> Callable:
+    """تقييد مسار بالمطور"""
+    async def wrapper(callback: CallbackQuery, state: FSMContext, payload):
+        if callback.from_user.id != DEVELOPER_ID:
+            await callback.answer("❌ هذا الزر للمطور فقط", show_alert=True)
+            return
+        await handler(callback, state, payload)
+    return wrapper
+
+class CallbackRouter:
+    """توجيه الأزرار بجداول: نصوص ثابتة، وبادئة نوع البيانات ثم الإجراء"""
+    
+    def __init__(self):
+        self.exact: Dict[str, Callable] = {}
+        self.word_prefixes: Dict[str, Callable] = {}
+        # بادئة CallbackData -> (الصنف، حقل الإجراء أو None، الإجراء -> المعالج)
+        self.typed: Dict[str, Tuple[type, Optional[str], Dict[Optional[str], Callable]]] = {}
+        self.field_types: Dict[str, List[Tuple[str, type]]] = {}
+        self.payload_types: Dict[str, type] = {}
+    
+    def add_exact(self, routes: Dict[str, Callable]):
+        self.exact.update(routes)
+    
+    def add_word_prefix(self, word: str, handler: Callable):
+        """مسار لكل البيانات التي تبدأ بـ word_"""
+        self.word_prefixes[word] = handler
+    
+    def add_typed(self, cls: type, routes: Dict[Optional[str], Callable], field: Optional[str] = None):
+        self.typed[cls.__prefix__] = (cls, field, routes)
+        self.field_types[cls.__prefix__] = [(name, info.annotation) for name, info in cls.model_fields.items()]
+        self.payload_types[cls.__prefix__] = namedtuple(f"{cls.__name__}Payload", list(cls.model_fields))
+    
+    def unpack(self, cls: type, data: str):
+        """تفكيك الحقول البسيطة (str/int) إلى namedtuple، أسرع بكثير من بناء نموذج pydantic"""
+        fields = self.field_types[cls.__prefix__]
+        parts = data.split(cls.__separator__)
+        if len(parts) != len(fields) + 1:
+            raise ValueError("عدد حقول غير صالح")
+        return self.payload_types[cls.__prefix__](*(
+            int(value) if annotation is int else value
+            for (_, annotation), value in zip(fields, parts[1:])
+        ))
+    
+    def resolve(self, data: str) -> Optional[Tuple[Callable, Any]]:
+        """إيجاد المعالج والبيانات المفككة لزر"""
+        handler = self.exact.get(data)
+        if handler is not None:
+            return handler, data
+        
+        prefix, sep, _ = data.partition(':')
+        if sep:
+            entry = self.typed.get(prefix)
+            if entry is None:
+                return None
+            cls, field, routes = entry
+            try:
+                payload = self.unpack(cls, data)
+            except (ValueError, TypeError):
+                return None
+            handler = routes.get(getattr(payload, field) if field else None)
+            return (handler, payload) if handler else None
+        
+        handler = self.word_prefixes.get(data.partition('_')[0])
+        if handler is not None:
+            return handler, data
+        
+        legacy = legacy_callback_payload(data)
+        return self.resolve(legacy) if legacy else None
+    
+    async def dispatch(self, callback: CallbackQuery, state: FSMContext) -> bool:
+        route = self.resolve(callback.data)
+        if route is None:
+            return False
+        handler, payload = route
+        await handler(callback, state, payload)
+        return True
+
+# الأزرار القديمة تتكرر في الرسائل نفسها، فيُحفظ تحويلها بدل بناء النموذج مع كل ضغطة
+@functools.lru_cache(maxsize=4096)
+def legacy_callback_payload(data: str) -> Optional[str]:
+    """تحويل صيغة الأزرار القديمة (name_..._id) الموجودة في رسائل سابقة"""
+    parts = data.split('_')
+    if len(parts) < 2 or not parts[-1].lstrip('-').isdigit():
+        return None
+    try:
+        if len(parts) >= 4 and parts[1] == 'app' and parts[2].isdigit():
+            return ApplicationCallback(action=parts[0], user_id=int(parts[2]), group_id=int(parts[3])).pack()
+        if parts[0] == 'setmode' and len(parts) >= 3:
+            # الأوضاع قد تحتوي "_" مثل mute_then_ban
+            return ModeCallback(mode='_'.join(parts[1:-1]), group_id=int(parts[-1])).pack()
+        return GroupCallback(action='_'.join(parts[:-1]), group_id=int(parts[-1])).pack()
+    except ValueError:
+        return None
+
+callback_router = CallbackRouter()
+
+callback_router.add_exact({
+    "main_menu": lambda c, s, p: start_command(c.message),
+    "settings_menu": lambda c, s, p: settings_command(c.message),
+    "global_stats": lambda c, s, p: show_global_stats(c),
+    "help_guide": lambda c, s, p: help_command(c.message),
+    "rate_bot": lambda c, s, p: rate_bot(c),
+    "dev_panel": _dev_only(lambda c, s, p: show_dev_panel(c)),
+    "update_stats": lambda c, s, p: update_global_stats(c),
+})
+callback_router.add_word_prefix("dev", _dev_only(lambda c, s, p: handle_dev_actions(c, p)))
+
+callback_router.add_typed(GroupCallback, {
+    # إدارة المجموعات
+    "manage": lambda c, s, p: show_group_panel(c, p.group_id),
+    "refresh": lambda c, s, p: show_group_panel(c, p.group_id),
+    "protection": lambda c, s, p: show_protection_panel(c, p.group_id),
+    # الكلمات والروابط والدول
+    "keywords": lambda c, s, p: show_keywords_panel(c, p.group_id),
+    "addkw": lambda c, s, p: add_keyword_handler(c, s, p.group_id),
+    "removekw": lambda c, s, p: remove_keyword_handler(c, s, p.group_id),
+    "links": lambda c, s, p: show_links_panel(c, p.group_id),
+    "countries": lambda c, s, p: show_countries_panel(c, p.group_id),
+    # الوضع الليلي
+    "night": lambda c, s, p: show_night_panel(c, p.group_id),
+    "togglenight": lambda c, s, p: toggle_night_mode(c, p.group_id),
+    # الأعضاء والمميزات
+    "members": lambda c, s, p: show_members_panel(c, p.group_id),
+    "features": lambda c, s, p: show_features_panel(c, p.group_id),
+    # الإحصائيات
+    "stats": lambda c, s, p: show_stats_panel(c, p.group_id),
+    "stats_details": lambda c, s, p: show_stats_details(c, p.group_id),
+    "stats_refresh": lambda c, s, p: refresh_stats(c, p.group_id),
+    # الإعدادات المتقدمة
+    "advanced": lambda c, s, p: show_advanced_panel(c, p.group_id),
+    "commands": lambda c, s, p: show_commands_panel(c, p.group_id),
+    "replies": lambda c, s, p: show_replies_panel(c, p.group_id),
+    "applicants": lambda c, s, p: show_applicants_panel(c, p.group_id),
+    "guide": lambda c, s, p: show_guide_panel(c, p.group_id),
+    # التنظيف
+    "clean_links": lambda c, s, p: handle_clean_action(c, p.group_id, "links"),
+    "clean_keywords": lambda c, s, p: handle_clean_action(c, p.group_id, "keywords"),
+    "clean_all": lambda c, s, p: handle_clean_action(c, p.group_id, "all"),
+    "clean_accounts": lambda c, s, p: handle_clean_action(c, p.group_id, "accounts"),
+}, field="action")
+
+callback_router.add_typed(ModeCallback, {
+    None: lambda c, s, p: set_protection_mode(c, p.group_id, p.mode),
+})
+
+callback_router.add_typed(ApplicationCallback, {
+    "accept": lambda c, s, p: accept_application(c, p.user_id, p.group_id),
+    "reject": lambda c, s, p: reject_application(c, p.user_id, p.group_id),
+}, field="action")
+
 # ================== معالج Callback الكامل ==================
 @dp.callback_query()
 async def handle_callback_query(callback: CallbackQuery, state: FSMContext):
     """معالج جميع الأزرار"""
     data = callback.data
+    remember_names(callback.message.chat if callback.message else None, callback.from_user)
     
     try:
         await callback.answer()
@@ -1676,193 +3807,7 @@ async def handle_callback_query(callback: CallbackQuery, state: FSMContext):
         if not data:
             return
         
-        # ===== الأزرار الرئيسية =====
-        if data == "main_menu":
-            await start_command(callback.message)
-            return
-            
-        elif data == "settings_menu":
-            await settings_command(callback.message)
-            return
-            
-        elif data == "global_stats":
-            await show_global_stats(callback)
-            return
-            
-        elif data == "help_guide":
-            await help_command(callback.message)
-            return
-            
-        elif data == "rate_bot":
-            await rate_bot(callback)
-            return
-            
-        elif data == "dev_panel":
-            if callback.from_user.id == DEVELOPER_ID:
-                await show_dev_panel(callback)
-            else:
-                await callback.answer("❌ هذا الزر للمطور فقط", show_alert=True)
-            return
-        
-        # ===== إدارة المجموعات =====
-        elif data.startswith("manage_"):
-            group_id = int(data.split("_")[1])
-            await show_group_panel(callback, group_id)
-            return
-            
-        elif data.startswith("refresh_"):
-            group_id = int(data.split("_")[1])
-            await show_group_panel(callback, group_id)
-            return
-        
-        # ===== الحماية الأساسية =====
-        elif data.startswith("protection_"):
-            group_id = int(data.split("_")[1])
-            await show_protection_panel(callback, group_id)
-            return
-            
-        elif data.startswith("setmode_"):
-            parts = data.split("_")
-            if len(parts) >= 3:
-                mode = parts[1]
-                group_id = int(parts[2])
-                await set_protection_mode(callback, group_id, mode)
-            return
-        
-        # ===== الكلمات الممنوعة =====
-        elif data.startswith("keywords_"):
-            group_id = int(data.split("_")[1])
-            await show_keywords_panel(callback, group_id)
-            return
-            
-        elif data.startswith("addkw_"):
-            group_id = int(data.split("_")[1])
-            await add_keyword_handler(callback, state, group_id)
-            return
-            
-        elif data.startswith("removekw_"):
-            group_id = int(data.split("_")[1])
-            await remove_keyword_handler(callback, state, group_id)
-            return
-        
-        # ===== الروابط الممنوعة =====
-        elif data.startswith("links_"):
-            group_id = int(data.split("_")[1])
-            await show_links_panel(callback, group_id)
-            return
-        
-        # ===== الدول المحظورة =====
-        elif data.startswith("countries_"):
-            group_id = int(data.split("_")[1])
-            await show_countries_panel(callback, group_id)
-            return
-        
-        # ===== الوضع الليلي =====
-        elif data.startswith("night_"):
-            group_id = int(data.split("_")[1])
-            await show_night_panel(callback, group_id)
-            return
-            
-        elif data.startswith("togglenight_"):
-            group_id = int(data.split("_")[1])
-            await toggle_night_mode(callback, group_id)
-            return
-        
-        # ===== إدارة الأعضاء =====
-        elif data.startswith("members_"):
-            group_id = int(data.split("_")[1])
-            await show_members_panel(callback, group_id)
-            return
-        
-        # ===== المميزات الإضافية =====
-        elif data.startswith("features_"):
-            group_id = int(data.split("_")[1])
-            await show_features_panel(callback, group_id)
-            return
-        
-        # ===== الإحصائيات =====
-        elif data.startswith("stats_"):
-            if "details" in data:
-                group_id = int(data.split("_")[2])
-                await show_stats_details(callback, group_id)
-            elif "refresh" in data:
-                group_id = int(data.split("_")[2])
-                await refresh_stats(callback, group_id)
-            else:
-                group_id = int(data.split("_")[1])
-                await show_stats_panel(callback, group_id)
-            return
-        
-        # ===== الإعدادات المتقدمة =====
-        elif data.startswith("advanced_"):
-            group_id = int(data.split("_")[1])
-            await show_advanced_panel(callback, group_id)
-            return
-        
-        # ===== الأوامر المخصصة =====
-        elif data.startswith("commands_"):
-            group_id = int(data.split("_")[1])
-            await show_commands_panel(callback, group_id)
-            return
-        
-        # ===== الردود التلقائية =====
-        elif data.startswith("replies_"):
-            group_id = int(data.split("_")[1])
-            await show_replies_panel(callback, group_id)
-            return
-        
-        # ===== نظام التقديم =====
-        elif data.startswith("applicants_"):
-            group_id = int(data.split("_")[1])
-            await show_applicants_panel(callback, group_id)
-            return
-            
-        elif data.startswith("accept_app_"):
-            parts = data.split("_")
-            if len(parts) >= 4:
-                user_id = int(parts[2])
-                group_id = int(parts[3])
-                await accept_application(callback, user_id, group_id)
-            return
-            
-        elif data.startswith("reject_app_"):
-            parts = data.split("_")
-            if len(parts) >= 4:
-                user_id = int(parts[2])
-                group_id = int(parts[3])
-                await reject_application(callback, user_id, group_id)
-            return
-        
-        # ===== التنظيف =====
-        elif data.startswith("clean_"):
-            parts = data.split("_")
-            if len(parts) >= 3:
-                action = parts[1]
-                group_id = int(parts[2])
-                await handle_clean_action(callback, group_id, action)
-            return
-        
-        # ===== الدليل =====
-        elif data.startswith("guide_"):
-            group_id = int(data.split("_")[1])
-            await show_guide_panel(callback, group_id)
-            return
-        
-        # ===== لوحة المطور =====
-        elif data.startswith("dev_"):
-            if callback.from_user.id == DEVELOPER_ID:
-                await handle_dev_actions(callback, data)
-            else:
-                await callback.answer("❌ هذا الزر للمطور فقط", show_alert=True)
-            return
-        
-        # ===== تحديث الإحصائيات =====
-        elif data == "update_stats":
-            await update_global_stats(callback)
-            return
-        
-        # ===== إجراءات أخرى =====
-        else:
+        if not await callback_router.dispatch(callback, state):
             await callback.answer("⚙️ هذا الزر قيد التطوير", show_alert=True)
             
     except Exception as e:
@@ -1875,7 +3820,8 @@ async def show_group_panel(callback: CallbackQuery, group_id: int):
     text, keyboard = get_main_control_panel(group_id)
     await safe_edit_message(callback, text, keyboard)
 
-async def show_protection_panel(callback: CallbackQuery, group_id: int):
+@cached_panel("protection")
+def render_protection_panel(group_id: int) -> Tuple[str, InlineKeyboardMarkup]:
     """عرض لوحة الحماية"""
     group_str = str(group_id)
     group_settings = settings.get(group_str, {})
@@ -1909,14 +3855,19 @@ async def show_protection_panel(callback: CallbackQuery, group_id: int):
         if mode_id == current_mode:
             keyboard.button(text=f"✅ {mode_name}", callback_data=f"#")
         else:
-            keyboard.button(text=mode_name, callback_data=f"setmode_{mode_id}_{group_id}")
+            keyboard.button(text=mode_name, callback_data=ModeCallback(mode=mode_id, group_id=group_id).pack())
     
-    keyboard.button(text="⚙️ إعدادات مخصصة", callback_data=f"custom_mode_{group_id}")
-    keyboard.button(text="⏱️ ضبط المدة", callback_data=f"set_duration_{group_id}")
-    keyboard.button(text="↩️ رجوع", callback_data=f"manage_{group_id}")
+    keyboard.button(text="⚙️ إعدادات مخصصة", callback_data=GroupCallback(action="custom_mode", group_id=group_id).pack())
+    keyboard.button(text="⏱️ ضبط المدة", callback_data=GroupCallback(action="set_duration", group_id=group_id).pack())
+    keyboard.button(text="↩️ رجوع", callback_data=GroupCallback(action="manage", group_id=group_id).pack())
     
     keyboard.adjust(2, 2, 1, 1, 1)
     
+    return text, keyboard.as_markup()
+
+async def show_protection_panel(callback: CallbackQuery, group_id: int):
+    """عرض لوحة الحماية"""
+    text, keyboard = render_protection_panel(group_id)
     await safe_edit_message(callback, text, keyboard)
 
 async def set_protection_mode(callback: CallbackQuery, group_id: int, mode: str):
@@ -1928,12 +3879,13 @@ async def set_protection_mode(callback: CallbackQuery, group_id: int, mode: str)
         return
     
     settings[group_str]['mode'] = mode
-    await save_settings()
+    await save_settings(group_id)
     
     await callback.answer(f"✅ تم تعيين وضع الحماية: {mode_to_text(mode)}", show_alert=True)
     await show_protection_panel(callback, group_id)
 
-async def show_keywords_panel(callback: CallbackQuery, group_id: int):
+@cached_panel("keywords")
+def render_keywords_panel(group_id: int) -> Tuple[str, InlineKeyboardMarkup]:
     """عرض لوحة الكلمات الممنوعة"""
     group_str = str(group_id)
     group_settings = settings.get(group_str, {})
@@ -1956,16 +3908,21 @@ async def show_keywords_panel(callback: CallbackQuery, group_id: int):
     text += "\n\n💡 <b>اختر الإجراء:</b>"
     
     keyboard = InlineKeyboardBuilder()
-    keyboard.button(text="➕ إضافة كلمة", callback_data=f"addkw_{group_id}")
-    keyboard.button(text="🗑️ حذف كلمة", callback_data=f"removekw_{group_id}")
-    keyboard.button(text="📋 عرض الكل", callback_data=f"showallkw_{group_id}")
-    keyboard.button(text="🧹 مسح الكل", callback_data=f"clearkw_{group_id}")
-    keyboard.button(text="📥 استيراد", callback_data=f"importkw_{group_id}")
-    keyboard.button(text="📤 تصدير", callback_data=f"exportkw_{group_id}")
-    keyboard.button(text="↩️ رجوع", callback_data=f"manage_{group_id}")
+    keyboard.button(text="➕ إضافة كلمة", callback_data=GroupCallback(action="addkw", group_id=group_id).pack())
+    keyboard.button(text="🗑️ حذف كلمة", callback_data=GroupCallback(action="removekw", group_id=group_id).pack())
+    keyboard.button(text="📋 عرض الكل", callback_data=GroupCallback(action="showallkw", group_id=group_id).pack())
+    keyboard.button(text="🧹 مسح الكل", callback_data=GroupCallback(action="clearkw", group_id=group_id).pack())
+    keyboard.button(text="📥 استيراد", callback_data=GroupCallback(action="importkw", group_id=group_id).pack())
+    keyboard.button(text="📤 تصدير", callback_data=GroupCallback(action="exportkw", group_id=group_id).pack())
+    keyboard.button(text="↩️ رجوع", callback_data=GroupCallback(action="manage", group_id=group_id).pack())
     
     keyboard.adjust(2, 2, 2)
     
+    return text, keyboard.as_markup()
+
+async def show_keywords_panel(callback: CallbackQuery, group_id: int):
+    """عرض لوحة الكلمات الممنوعة"""
+    text, keyboard = render_keywords_panel(group_id)
     await safe_edit_message(callback, text, keyboard)
 
 async def add_keyword_handler(callback: CallbackQuery, state: FSMContext, group_id: int):
@@ -1981,7 +3938,7 @@ async def add_keyword_handler(callback: CallbackQuery, state: FSMContext, group_
         "• رابط\n"
         "• نمط (مثال: *كلمة*)",
         reply_markup=InlineKeyboardMarkup(inline_keyboard=[
-            [InlineKeyboardButton(text="↩️ إلغاء", callback_data=f"keywords_{group_id}")]
+            [InlineKeyboardButton(text="↩️ إلغاء", callback_data=GroupCallback(action="keywords", group_id=group_id).pack())]
         ])
     )
 
@@ -1994,11 +3951,12 @@ async def remove_keyword_handler(callback: CallbackQuery, state: FSMContext, gro
         "🗑️ <b>أرسل الكلمة المراد حذفها:</b>\n\n"
         "اكتب الكلمة تماماً كما هي",
         reply_markup=InlineKeyboardMarkup(inline_keyboard=[
-            [InlineKeyboardButton(text="↩️ إلغاء", callback_data=f"keywords_{group_id}")]
+            [InlineKeyboardButton(text="↩️ إلغاء", callback_data=GroupCallback(action="keywords", group_id=group_id).pack())]
         ])
     )
 
-async def show_links_panel(callback: CallbackQuery, group_id: int):
+@cached_panel("links")
+def render_links_panel(group_id: int) -> Tuple[str, InlineKeyboardMarkup]:
     """عرض لوحة الروابط الممنوعة"""
     group_str = str(group_id)
     group_settings = settings.get(group_str, {})
@@ -2020,15 +3978,21 @@ async def show_links_panel(callback: CallbackQuery, group_id: int):
     text += "\n\n💡 <b>اختر الإجراء:</b>"
     
     keyboard = InlineKeyboardBuilder()
-    keyboard.button(text="➕ إضافة رابط", callback_data=f"addlink_{group_id}")
-    keyboard.button(text="🗑️ حذف رابط", callback_data=f"removelink_{group_id}")
-    keyboard.button(text="↩️ رجوع", callback_data=f"manage_{group_id}")
+    keyboard.button(text="➕ إضافة رابط", callback_data=GroupCallback(action="addlink", group_id=group_id).pack())
+    keyboard.button(text="🗑️ حذف رابط", callback_data=GroupCallback(action="removelink", group_id=group_id).pack())
+    keyboard.button(text="↩️ رجوع", callback_data=GroupCallback(action="manage", group_id=group_id).pack())
     
     keyboard.adjust(2, 1)
     
+    return text, keyboard.as_markup()
+
+async def show_links_panel(callback: CallbackQuery, group_id: int):
+    """عرض لوحة الروابط الممنوعة"""
+    text, keyboard = render_links_panel(group_id)
     await safe_edit_message(callback, text, keyboard)
 
-async def show_countries_panel(callback: CallbackQuery, group_id: int):
+@cached_panel("countries")
+def render_countries_panel(group_id: int) -> Tuple[str, InlineKeyboardMarkup]:
     """عرض لوحة الدول المحظورة"""
     group_str = str(group_id)
     group_settings = settings.get(group_str, {})
@@ -2051,16 +4015,22 @@ async def show_countries_panel(callback: CallbackQuery, group_id: int):
     text += "\n\n💡 <b>اختر الإجراء:</b>"
     
     keyboard = InlineKeyboardBuilder()
-    keyboard.button(text="➕ إضافة دولة", callback_data=f"addcountry_{group_id}")
-    keyboard.button(text="🗑️ حذف دولة", callback_data=f"removecountry_{group_id}")
-    keyboard.button(text="🔧 تفعيل/تعطيل", callback_data=f"togglecountry_{group_id}")
-    keyboard.button(text="↩️ رجوع", callback_data=f"manage_{group_id}")
+    keyboard.button(text="➕ إضافة دولة", callback_data=GroupCallback(action="addcountry", group_id=group_id).pack())
+    keyboard.button(text="🗑️ حذف دولة", callback_data=GroupCallback(action="removecountry", group_id=group_id).pack())
+    keyboard.button(text="🔧 تفعيل/تعطيل", callback_data=GroupCallback(action="togglecountry", group_id=group_id).pack())
+    keyboard.button(text="↩️ رجوع", callback_data=GroupCallback(action="manage", group_id=group_id).pack())
     
     keyboard.adjust(2, 2)
     
+    return text, keyboard.as_markup()
+
+async def show_countries_panel(callback: CallbackQuery, group_id: int):
+    """عرض لوحة الدول المحظورة"""
+    text, keyboard = render_countries_panel(group_id)
     await safe_edit_message(callback, text, keyboard)
 
-async def show_night_panel(callback: CallbackQuery, group_id: int):
+@cached_panel("night")
+def render_night_panel(group_id: int) -> Tuple[str, InlineKeyboardMarkup]:
     """عرض لوحة الوضع الليلي"""
     group_str = str(group_id)
     group_settings = settings.get(group_str, {})
@@ -2081,17 +4051,22 @@ async def show_night_panel(callback: CallbackQuery, group_id: int):
     keyboard = InlineKeyboardBuilder()
     
     if group_settings.get('night_mode_enabled', False):
-        keyboard.button(text="❌ تعطيل الوضع الليلي", callback_data=f"togglenight_{group_id}")
+        keyboard.button(text="❌ تعطيل الوضع الليلي", callback_data=GroupCallback(action="togglenight", group_id=group_id).pack())
     else:
-        keyboard.button(text="✅ تفعيل الوضع الليلي", callback_data=f"togglenight_{group_id}")
+        keyboard.button(text="✅ تفعيل الوضع الليلي", callback_data=GroupCallback(action="togglenight", group_id=group_id).pack())
     
-    keyboard.button(text="⏰ تغيير وقت البدء", callback_data=f"changestart_{group_id}")
-    keyboard.button(text="⏰ تغيير وقت الانتهاء", callback_data=f"changeend_{group_id}")
-    keyboard.button(text="🔔 إعدادات الإشعارات", callback_data=f"nightnotif_{group_id}")
-    keyboard.button(text="↩️ رجوع", callback_data=f"manage_{group_id}")
+    keyboard.button(text="⏰ تغيير وقت البدء", callback_data=GroupCallback(action="changestart", group_id=group_id).pack())
+    keyboard.button(text="⏰ تغيير وقت الانتهاء", callback_data=GroupCallback(action="changeend", group_id=group_id).pack())
+    keyboard.button(text="🔔 إعدادات الإشعارات", callback_data=GroupCallback(action="nightnotif", group_id=group_id).pack())
+    keyboard.button(text="↩️ رجوع", callback_data=GroupCallback(action="manage", group_id=group_id).pack())
     
     keyboard.adjust(1, 2, 2)
     
+    return text, keyboard.as_markup()
+
+async def show_night_panel(callback: CallbackQuery, group_id: int):
+    """عرض لوحة الوضع الليلي"""
+    text, keyboard = render_night_panel(group_id)
     await safe_edit_message(callback, text, keyboard)
 
 async def toggle_night_mode(callback: CallbackQuery, group_id: int):
@@ -2105,13 +4080,14 @@ async def toggle_night_mode(callback: CallbackQuery, group_id: int):
     current = settings[group_str].get('night_mode_enabled', False)
     settings[group_str]['night_mode_enabled'] = not current
     
-    await save_settings()
+    await save_settings(group_id)
     
     action = "تعطيل" if current else "تفعيل"
     await callback.answer(f"✅ تم {action} الوضع الليلي", show_alert=True)
     await show_night_panel(callback, group_id)
 
-async def show_members_panel(callback: CallbackQuery, group_id: int):
+@cached_panel("members")
+def render_members_panel(group_id: int) -> Tuple[str, InlineKeyboardMarkup]:
     """عرض لوحة إدارة الأعضاء"""
     group_str = str(group_id)
     group_settings = settings.get(group_str, {})
@@ -2134,19 +4110,25 @@ async def show_members_panel(callback: CallbackQuery, group_id: int):
 📌 <b>اختر الإجراء:</b>"""
     
     keyboard = InlineKeyboardBuilder()
-    keyboard.button(text="👑 إضافة مستثنى", callback_data=f"addexempt_{group_id}")
-    keyboard.button(text="⭐ إضافة مميز", callback_data=f"addvip_{group_id}")
-    keyboard.button(text="✅ إضافة موثوق", callback_data=f"addtrusted_{group_id}")
-    keyboard.button(text="📋 قائمة المستثنين", callback_data=f"listexempt_{group_id}")
-    keyboard.button(text="📋 قائمة المميزين", callback_data=f"listvip_{group_id}")
-    keyboard.button(text="🛡️ حماية الجدد", callback_data=f"newprotect_{group_id}")
-    keyboard.button(text="↩️ رجوع", callback_data=f"manage_{group_id}")
+    keyboard.button(text="👑 إضافة مستثنى", callback_data=GroupCallback(action="addexempt", group_id=group_id).pack())
+    keyboard.button(text="⭐ إضافة مميز", callback_data=GroupCallback(action="addvip", group_id=group_id).pack())
+    keyboard.button(text="✅ إضافة موثوق", callback_data=GroupCallback(action="addtrusted", group_id=group_id).pack())
+    keyboard.button(text="📋 قائمة المستثنين", callback_data=GroupCallback(action="listexempt", group_id=group_id).pack())
+    keyboard.button(text="📋 قائمة المميزين", callback_data=GroupCallback(action="listvip", group_id=group_id).pack())
+    keyboard.button(text="🛡️ حماية الجدد", callback_data=GroupCallback(action="newprotect", group_id=group_id).pack())
+    keyboard.button(text="↩️ رجوع", callback_data=GroupCallback(action="manage", group_id=group_id).pack())
     
     keyboard.adjust(2, 2, 2, 1)
     
+    return text, keyboard.as_markup()
+
+async def show_members_panel(callback: CallbackQuery, group_id: int):
+    """عرض لوحة إدارة الأعضاء"""
+    text, keyboard = render_members_panel(group_id)
     await safe_edit_message(callback, text, keyboard)
 
-async def show_features_panel(callback: CallbackQuery, group_id: int):
+@cached_panel("features")
+def render_features_panel(group_id: int) -> Tuple[str, InlineKeyboardMarkup]:
     """عرض لوحة المميزات الإضافية"""
     group_str = str(group_id)
     group_settings = settings.get(group_str, {})
@@ -2174,27 +4156,35 @@ async def show_features_panel(callback: CallbackQuery, group_id: int):
 📌 <b>اختر الميزة التي تريد تعديلها:</b>"""
     
     keyboard = InlineKeyboardBuilder()
-    keyboard.button(text="📋 نظام التقديم", callback_data=f"toggle_applicants_{group_id}")
-    keyboard.button(text="💾 النسخ الاحتياطي", callback_data=f"toggle_backup_{group_id}")
-    keyboard.button(text="📈 التقارير", callback_data=f"toggle_reports_{group_id}")
-    keyboard.button(text="🏆 التحديات", callback_data=f"toggle_challenges_{group_id}")
-    keyboard.button(text="🎭 كل المميزات", callback_data=f"all_features_{group_id}")
-    keyboard.button(text="↩️ رجوع", callback_data=f"manage_{group_id}")
+    keyboard.button(text="📋 نظام التقديم", callback_data=GroupCallback(action="toggle_applicants", group_id=group_id).pack())
+    keyboard.button(text="💾 النسخ الاحتياطي", callback_data=GroupCallback(action="toggle_backup", group_id=group_id).pack())
+    keyboard.button(text="📈 التقارير", callback_data=GroupCallback(action="toggle_reports", group_id=group_id).pack())
+    keyboard.button(text="🏆 التحديات", callback_data=GroupCallback(action="toggle_challenges", group_id=group_id).pack())
+    keyboard.button(text="🎭 كل المميزات", callback_data=GroupCallback(action="all_features", group_id=group_id).pack())
+    keyboard.button(text="↩️ رجوع", callback_data=GroupCallback(action="manage", group_id=group_id).pack())
     
     keyboard.adjust(2, 2, 1, 1)
     
+    return text, keyboard.as_markup()
+
+async def show_features_panel(callback: CallbackQuery, group_id: int):
+    """عرض لوحة المميزات الإضافية"""
+    text, keyboard = render_features_panel(group_id)
     await safe_edit_message(callback, text, keyboard)
 
-async def show_stats_panel(callback: CallbackQuery, group_id: int):
+@cached_panel("stats", stats=True)
+def render_stats_panel(group_id: int) -> Tuple[str, InlineKeyboardMarkup]:
     """عرض لوحة الإحصائيات"""
     group_str = str(group_id)
     group_stats = bot_stats['groups'].get(group_str, {})
+    last_day = stats_series.last_days(group_str, 1)
+    last_week = stats_series.last_days(group_str, 7)
     
     text = f"""📊 <b>إحصائيات مفصلة</b> {get_random_emoji()}
 
 📈 <b>إحصائيات النشاط:</b>
 • الرسائل المفحوصة: {format_number(group_stats.get('messages_checked', 0))}
-• الأعضاء النشطين: {len(group_stats.get('active_users', set()))}
+• الأعضاء النشطين اليوم: {get_active_users_count(group_stats)}
 • آخر نشاط: {datetime.fromtimestamp(group_stats.get('last_activity', time.time())).strftime('%H:%M:%S')}
 
 ⚠️ <b>إحصائيات الأمان:</b>
@@ -2203,35 +4193,37 @@ async def show_stats_panel(callback: CallbackQuery, group_id: int):
 • الكتم: {group_stats.get('mutes', 0)}
 • التحذيرات: {group_stats.get('warnings', 0)}
 
-🏆 <b>أكثر الأعضاء نشاطاً:</b>"""
-    
-    # الحصول على أكثر الأعضاء نشاطاً
-    active_users = list(group_stats.get('active_users', set()))[:5]
-    if active_users:
-        for i, user_id in enumerate(active_users, 1):
-            try:
-                user = await bot.get_chat_member(group_id, user_id)
-                name = user.user.full_name[:20]
-                text += f"\n{i}. {name}"
-            except:
-                text += f"\n{i}. مستخدم {user_id}"
-    else:
-        text += "\nلا توجد بيانات كافية"
+🕐 <b>آخر 24 ساعة / آخر 7 أيام:</b>
+• الرسائل: {format_number(last_day['messages'])} / {format_number(last_week['messages'])}
+• المخالفات: {last_day['violations']} / {last_week['violations']}
+• الحظور: {last_day['bans']} / {last_week['bans']}
+• الكتم: {last_day['mutes']} / {last_week['mutes']}
+
+👥 <b>الأعضاء النشطين:</b>
+• آخر ساعة: {get_active_users_count(group_stats, 'hourly')}
+• آخر 24 ساعة: {get_active_users_count(group_stats, 'daily')}
+• آخر 7 أيام: {get_active_users_count(group_stats, 'weekly')}"""
     
     text += "\n\n📌 <b>اختر الإجراء:</b>"
     
     keyboard = InlineKeyboardBuilder()
-    keyboard.button(text="🔄 تحديث", callback_data=f"stats_refresh_{group_id}")
-    keyboard.button(text="📈 تفاصيل أكثر", callback_data=f"stats_details_{group_id}")
-    keyboard.button(text="📋 تقرير مفصل", callback_data=f"full_report_{group_id}")
-    keyboard.button(text="📤 تصدير البيانات", callback_data=f"export_stats_{group_id}")
-    keyboard.button(text="↩️ رجوع", callback_data=f"manage_{group_id}")
+    keyboard.button(text="🔄 تحديث", callback_data=GroupCallback(action="stats_refresh", group_id=group_id).pack())
+    keyboard.button(text="📈 تفاصيل أكثر", callback_data=GroupCallback(action="stats_details", group_id=group_id).pack())
+    keyboard.button(text="📋 تقرير مفصل", callback_data=GroupCallback(action="full_report", group_id=group_id).pack())
+    keyboard.button(text="📤 تصدير البيانات", callback_data=GroupCallback(action="export_stats", group_id=group_id).pack())
+    keyboard.button(text="↩️ رجوع", callback_data=GroupCallback(action="manage", group_id=group_id).pack())
     
     keyboard.adjust(2, 2, 1)
     
+    return text, keyboard.as_markup()
+
+async def show_stats_panel(callback: CallbackQuery, group_id: int):
+    """عرض لوحة الإحصائيات"""
+    text, keyboard = render_stats_panel(group_id)
     await safe_edit_message(callback, text, keyboard)
 
-async def show_advanced_panel(callback: CallbackQuery, group_id: int):
+@cached_panel("advanced")
+def render_advanced_panel(group_id: int) -> Tuple[str, InlineKeyboardMarkup]:
     """عرض لوحة الإعدادات المتقدمة"""
     text = f"""⚙️ <b>الإعدادات المتقدمة</b> {get_random_emoji()}
 
@@ -2265,16 +4257,21 @@ async def show_advanced_panel(callback: CallbackQuery, group_id: int):
 📌 <b>اختر القسم:</b>"""
     
     keyboard = InlineKeyboardBuilder()
-    keyboard.button(text="🎨 التخصيص", callback_data=f"customization_{group_id}")
-    keyboard.button(text="🔔 الإشعارات", callback_data=f"notifications_{group_id}")
-    keyboard.button(text="🌐 اللغات", callback_data=f"languages_{group_id}")
-    keyboard.button(text="🔐 الأمان", callback_data=f"security_{group_id}")
-    keyboard.button(text="📡 التكاملات", callback_data=f"integrations_{group_id}")
-    keyboard.button(text="⚡ الأداء", callback_data=f"performance_{group_id}")
-    keyboard.button(text="↩️ رجوع", callback_data=f"manage_{group_id}")
+    keyboard.button(text="🎨 التخصيص", callback_data=GroupCallback(action="customization", group_id=group_id).pack())
+    keyboard.button(text="🔔 الإشعارات", callback_data=GroupCallback(action="notifications", group_id=group_id).pack())
+    keyboard.button(text="🌐 اللغات", callback_data=GroupCallback(action="languages", group_id=group_id).pack())
+    keyboard.button(text="🔐 الأمان", callback_data=GroupCallback(action="security", group_id=group_id).pack())
+    keyboard.button(text="📡 التكاملات", callback_data=GroupCallback(action="integrations", group_id=group_id).pack())
+    keyboard.button(text="⚡ الأداء", callback_data=GroupCallback(action="performance", group_id=group_id).pack())
+    keyboard.button(text="↩️ رجوع", callback_data=GroupCallback(action="manage", group_id=group_id).pack())
     
     keyboard.adjust(2, 2, 2, 1)
     
+    return text, keyboard.as_markup()
+
+async def show_advanced_panel(callback: CallbackQuery, group_id: int):
+    """عرض لوحة الإعدادات المتقدمة"""
+    text, keyboard = render_advanced_panel(group_id)
     await safe_edit_message(callback, text, keyboard)
 
 async def show_global_stats(callback: CallbackQuery):
@@ -2299,6 +4296,7 @@ async def show_global_stats(callback: CallbackQuery):
 📊 <b>نظرة عامة:</b>
 • عدد المجموعات: {total_groups}
 • عدد المستخدمين: {total_users}
+• الأعضاء النشطين اليوم: {format_number(global_active_users('daily'))}
 • وقت التشغيل: {days} يوم, {hours} ساعة, {minutes} دقيقة
 
 📈 <b>إحصائيات الأداء:</b>
@@ -2322,11 +4320,7 @@ async def show_global_stats(callback: CallbackQuery):
     )[:5]
     
     for i, (group_id, stats) in enumerate(sorted_groups, 1):
-        try:
-            chat = await bot.get_chat(int(group_id))
-            group_name = chat.title[:20]
-        except:
-            group_name = f"مجموعة {group_id}"
+        group_name = (await get_chat_title(int(group_id)))[:20]
         
         text += f"\n{i}. {group_name} - {format_number(stats['messages_checked'])} رسالة"
     
@@ -2340,12 +4334,19 @@ async def show_global_stats(callback: CallbackQuery):
     
     keyboard.adjust(2, 2)
     
-    await safe_edit_message(callback, text, keyboard)
+    await safe_edit_message(callback, text, keyboard.as_markup())
 
 async def show_dev_panel(callback: CallbackQuery):
     """عرض لوحة المطور"""
+    system = system_sampler.latest()
     text = f"""👑 <b>لوحة تحكم المطور</b> {get_random_emoji()}
 
+💻 <b>حالة النظام الآن:</b>
+• الذاكرة: {system['memory_mb']:.1f} MB
+• المعالج: {system['cpu_percent']:.1f}% (العملية: {system['process_cpu_percent']:.1f}%)
+• تأخر حلقة الأحداث: {system['loop_lag_ms']:.1f} ms
+• الملفات المفتوحة: {system['open_fds'] if system['open_fds'] is not None else 'غير متاح'}
+
 🛠️ <b>أدوات النظام:</b>
 • إعادة تشغيل البوت
 • عرض السجلات
@@ -2396,7 +4397,7 @@ async def show_dev_panel(callback: CallbackQuery):
     
     keyboard.adjust(4, 4, 4, 1)
     
-    await safe_edit_message(callback, text, keyboard)
+    await safe_edit_message(callback, text, keyboard.as_markup())
 
 async def handle_dev_actions(callback: CallbackQuery, action: str):
     """معالجة إجراءات المطور"""
@@ -2404,7 +4405,7 @@ async def handle_dev_actions(callback: CallbackQuery, action: str):
         await callback.answer("🔄 جاري إعادة التشغيل...", show_alert=True)
         # هنا سيتم إعادة تشغيل البوت
         await asyncio.sleep(2)
-        await callback.message.edit_text("✅ تم إعادة التشغيل بنجاح")
+        await safe_edit_message(callback, "✅ تم إعادة التشغيل بنجاح")
         
     elif action == "dev_logs":
         await send_logs(callback)
@@ -2470,7 +4471,7 @@ async def rate_bot(callback: CallbackQuery):
     
     keyboard.adjust(1, 1, 1, 1, 1, 1, 1)
     
-    await safe_edit_message(callback, text, keyboard)
+    await safe_edit_message(callback, text, keyboard.as_markup())
 
 # ================== معالج الرسائل العام ==================
 @dp.message()
@@ -2484,6 +4485,8 @@ async def handle_all_messages(message: Message, state: FSMContext):
         if message.from_user.is_bot:
             return
         
+        remember_names(message.chat, message.from_user)
+        
         # تحديث إحصائيات الرسائل
         await update_stats(chat_id, 'message', user_id)
         
@@ -2516,20 +4519,10 @@ async def handle_group_message(message: Message, state: FSMContext):
     # التحقق من الوضع الليلي
     if await check_night_mode(group_str):
         if user_role == UserRole.MEMBER:  # الأعضاء العاديين فقط
-            await message.delete()
+            await safe_delete_message(chat_id, message.message_id)
             
-            # إرسال تحذير
-            try:
-                warning = await message.answer(
-                    f"🌙 <b>الوضع الليلي مفعل</b>\n\n"
-                    f"⏰ الوقت الحالي: {datetime.now().strftime('%H:%M')}\n"
-                    f"🚫 النشر متوقف حتى: {settings[group_str]['night_end']}\n\n"
-                    f"💤 استريحوا وناموا جيداً!"
-                )
-                await asyncio.sleep(10)
-                await warning.delete()
-            except:
-                pass
+            # تنبيه واحد لكل نافذة، يُرسل خارج الجزء المرتب
+            spawn_background(night_notices.notify(chat_id, group_str), "تنبيه الوضع الليلي")
             return
     
     # الحصول على النص
@@ -2543,7 +4536,7 @@ async def handle_group_message(message: Message, state: FSMContext):
     # التحقق من الردود التلقائية
     auto_reply = await check_auto_reply(chat_id, text)
     if auto_reply:
-        await message.reply(auto_reply)
+        spawn_background(message.reply(auto_reply), "الرد التلقائي")
         return
     
     # الكشف عن المحتوى المخالف
@@ -2609,12 +4602,12 @@ async def handle_fsm_states(message: Message, state: FSMContext, current_state:
                 await message.reply("⚠️ هذه الكلمة موجودة بالفعل")
             else:
                 settings[group_str].setdefault('banned_keywords', []).append(keyword)
-                await save_settings()
+                await save_settings(group_str)
                 await message.reply(f"✅ <b>تم إضافة الكلمة:</b> <code>{keyword}</code>")
         else:  # remove
             if keyword in settings[group_str].get('banned_keywords', []):
                 settings[group_str]['banned_keywords'].remove(keyword)
-                await save_settings()
+                await save_settings(group_str)
                 await message.reply(f"✅ <b>تم حذف الكلمة:</b> <code>{keyword}</code>")
             else:
                 await message.reply("⚠️ هذه الكلمة غير موجودة")
@@ -2627,8 +4620,8 @@ async def handle_fsm_states(message: Message, state: FSMContext, current_state:
 async def show_keywords_panel_after_action(message: Message, group_id: int):
     """عرض لوحة الكلمات بعد الإجراء"""
     keyboard = InlineKeyboardBuilder()
-    keyboard.button(text="↩️ العودة للكلمات", callback_data=f"keywords_{group_id}")
-    keyboard.button(text="🏠 القائمة الرئيسية", callback_data=f"manage_{group_id}")
+    keyboard.button(text="↩️ العودة للكلمات", callback_data=GroupCallback(action="keywords", group_id=group_id).pack())
+    keyboard.button(text="🏠 القائمة الرئيسية", callback_data=GroupCallback(action="manage", group_id=group_id).pack())
     keyboard.adjust(1)
     
     await message.answer(
@@ -2637,6 +4630,152 @@ async def show_keywords_panel_after_action(message: Message, group_id: int):
         reply_markup=keyboard.as_markup()
     )
 
+BROADCAST_CONCURRENCY = int(os.getenv("BROADCAST_CONCURRENCY", 8))
+BROADCAST_STATE_FILE = os.getenv("BROADCAST_STATE_FILE", "broadcast_state.json")
+BROADCAST_PROGRESS_INTERVAL = 5  # ثوانٍ بين تحديثات رسالة الحالة
+
+BROADCAST_FAILURE_LABELS = {
+    'kicked': '🚫 البوت مطرود',
+    'not_found': '❓ المحادثة غير موجودة',
+    'flood': '⏳ تجاوز حد الإرسال',
+    'error': '❌ أخطاء أخرى'
+}
+
+broadcast_results = metrics.register(MetricCounter(
+    "bot_broadcast_results_total", "Broadcast deliveries by outcome", ("status",)))
+
+class BroadcastEngine:
+    """تنفيذ البث كمهمة خلفية بتوازٍ محدود وتقدم قابل للاستئناف"""
+    
+    def __init__(self, state_file: str):
+        self.state_file = state_file
+        self.job: Optional[Dict[str, Any]] = None
+        self._task: Optional[asyncio.Task] = None
+    
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+    
+    def _write_state(self, snapshot: Optional[str]):
+        if snapshot is None:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(self.state_file)
+            return
+        tmp_path = f"{self.state_file}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(snapshot)
+        os.replace(tmp_path, self.state_file)
+    
+    async def _persist(self):
+        snapshot = json.dumps(self.job, ensure_ascii=False) if self.job else None
+        try:
+            await asyncio.to_thread(self._write_state, snapshot)
+        except Exception as e:
+            logger.error(f"خطأ في حفظ حالة البث: {e}")
+    
+    def start(self, text: str, targets: List[int], status_chat_id: int, status_message_id: int) -> bool:
+        """بدء بث جديد (مهمة واحدة في كل مرة)"""
+        if self.running:
+            return False
+        self.job = {
+            'id': int(time.time()),
+            'text': text,
+            'targets': list(targets),
+            'results': {},
+            'status_chat_id': status_chat_id,
+            'status_message_id': status_message_id,
+            'started_at': time.time()
+        }
+        self._task = asyncio.create_task(self._run())
+        return True
+    
+    async def resume(self):
+        """استئناف بث غير مكتمل بعد إعادة التشغيل"""
+        try:
+            with open(self.state_file, encoding='utf-8') as f:
+                job = json.load(f)
+        except FileNotFoundError:
+            return
+        except Exception as e:
+            logger.error(f"خطأ في قراءة حالة البث: {e}")
+            return
+        
+        self.job = job
+        remaining = len(job['targets']) - len(job['results'])
+        logger.info(f"استئناف البث {job['id']}: متبقٍ {remaining} مجموعة")
+        self._task = asyncio.create_task(self._run())
+    
+    def progress_text(self, finished: bool = False) -> str:
+        """نص حالة البث"""
+        job = self.job
+        counts = Counter(job['results'].values())
+        done = len(job['results'])
+        total = len(job['targets'])
+        percent = done * 100 // total if total else 100
+        
+        title = "✅ <b>تم البث!</b>" if finished else "📢 <b>جاري البث...</b>"
+        text = (
+            f"{title}\n\n"
+            f"📊 التقدم: {done}/{total} ({percent}%)\n"
+            f"📤 تم الإرسال لـ: {counts.get('sent', 0)} مجموعة"
+        )
+        for status, label in BROADCAST_FAILURE_LABELS.items():
+            if counts.get(status):
+                text += f"\n{label}: {counts[status]}"
+        return text
+    
+    async def _update_status(self, finished: bool = False):
+        try:
+            await bot.edit_message_text(
+                self.progress_text(finished),
+                chat_id=self.job['status_chat_id'],
+                message_id=self.job['status_message_id']
+            )
+        except Exception:
+            pass
+    
+    async def _send(self, group_id: int, semaphore: asyncio.Semaphore):
+        async with semaphore:
+            try:
+                with outbound_priority(OutboundPriority.REPORT):
+                    await bot.send_message(
+                        group_id,
+                        f"📢 <b>إعلان من المطور:</b>\n\n{self.job['text']}\n\n"
+                        f"🛡️ <i>الحارس الأمني المتقدم</i>"
+                    )
+                status = 'sent'
+            except Exception as e:
+                status = classify_delivery_error(e)
+                logger.error(f"فشل البث للمجموعة {group_id} ({status}): {e}")
+            self.job['results'][str(group_id)] = status
+            broadcast_results.inc(labels=(status,))
+    
+    async def _report_progress(self):
+        while True:
+            await asyncio.sleep(BROADCAST_PROGRESS_INTERVAL)
+            await self._persist()
+            await self._update_status()
+    
+    async def _run(self):
+        job = self.job
+        await self._persist()
+        
+        # حد التوازي فوق حد الإرسال العام في جدول الطلبات الصادرة
+        semaphore = asyncio.Semaphore(BROADCAST_CONCURRENCY)
+        pending = [g for g in job['targets'] if str(g) not in job['results']]
+        reporter = asyncio.create_task(self._report_progress())
+        try:
+            await asyncio.gather(*(self._send(group_id, semaphore) for group_id in pending))
+        finally:
+            reporter.cancel()
+        
+        await self._update_status(finished=True)
+        logger.info(f"انتهى البث {job['id']}: {dict(Counter(job['results'].values()))}")
+        self.job = None
+        await self._persist()
+
+broadcast_engine = BroadcastEngine(BROADCAST_STATE_FILE)
+
 async def handle_developer_broadcast(message: Message):
     """معالجة بث المطور"""
     broadcast_text = message.text.replace("/broadcast", "").strip()
@@ -2645,41 +4784,25 @@ async def handle_developer_broadcast(message: Message):
         await message.reply("⚠️ الرجاء إدخال نص للبث")
         return
     
+    if broadcast_engine.running:
+        await message.reply("⏳ يوجد بث قيد التنفيذ، انتظر حتى ينتهي")
+        return
+    
     # إرسال رسالة الانتظار
     wait_msg = await message.reply("📢 <b>جاري البث...</b>")
     
-    success = 0
-    failed = 0
-    
-    for group_id in ALLOWED_GROUP_IDS:
-        try:
-            await bot.send_message(
-                group_id,
-                f"📢 <b>إعلان من المطور:</b>\n\n{broadcast_text}\n\n"
-                f"🛡️ <i>الحارس الأمني المتقدم</i>"
-            )
-            success += 1
-            await asyncio.sleep(0.5)  # لتجنب حظر التلقرام
-        except Exception as e:
-            logger.error(f"فشل البث للمجموعة {group_id}: {e}")
-            failed += 1
-    
-    await wait_msg.edit_text(
-        f"✅ <b>تم البث بنجاح!</b>\n\n"
-        f"📤 تم الإرسال لـ: {success} مجموعة\n"
-        f"❌ فشل الإرسال لـ: {failed} مجموعة"
-    )
+    broadcast_engine.start(broadcast_text, ALLOWED_GROUP_IDS, wait_msg.chat.id, wait_msg.message_id)
 
 # ================== المهام الخلفية ==================
 async def background_tasks():
     """تشغيل المهام الخلفية"""
     logger.info("🚀 بدء المهام الخلفية...")
     
+    # المهمة 1: التحقق من الوضع الليلي (حلقة مستقلة لا تنتهي)
+    spawn_background(night_mode_checker(), "الوضع الليلي")
+    
     while True:
         try:
-            # المهمة 1: التحقق من الوضع الليلي
-            await night_mode_checker()
-            
             # المهمة 2: النسخ الاحتياطي التلقائي
             await auto_backup_task()
             
@@ -2703,8 +4826,9 @@ async def auto_backup_task():
     """المهمة الخلفية للنسخ الاحتياطي التلقائي"""
     try:
         current_time = time.time()
+        due_groups = []
         
-        for group_id in ALLOWED_GROUP_IDS:
+        for group_id in owned_group_ids():
             group_str = str(group_id)
             
             if group_str in settings:
@@ -2716,8 +4840,12 @@ async def auto_backup_task():
                     
                     # إذا مر أسبوع منذ آخر نسخة
                     if current_time - last_backup >= 604800:
-                        logger.info(f"إنشاء نسخة احتياطية تلقائية للمجموعة {group_id}")
-                        await create_backup(group_id, manual=False)
+                        due_groups.append(group_id)
+        
+        if due_groups:
+            # أرشيف واحد يضم المجموعات التي تغيرت فقط
+            logger.info(f"إنشاء نسخة احتياطية تلقائية تزايدية لـ {len(due_groups)} مجموعة")
+            await create_groups_backup(due_groups, manual=False, incremental=True)
                         
     except Exception as e:
         logger.error(f"خطأ في النسخ الاحتياطي التلقائي: {e}")
@@ -2726,47 +4854,55 @@ async def weekly_reports_task():
     """المهمة الخلفية للتقارير الأسبوعية"""
     try:
         # إرسال التقارير كل يوم اثنين
-        if datetime.now().weekday() == 0:  # يوم الاثنين
-            for group_id in ALLOWED_GROUP_IDS:
+        today = datetime.now()
+        if today.weekday() == 0:  # يوم الاثنين
+            # الحلقة تعمل كل ساعة، لذلك نسجل الأسبوع المرسل لكل مجموعة
+            iso_year, iso_week, _ = today.isocalendar()
+            week_key = f"{iso_year}-W{iso_week:02d}"
+            sent = []
+            
+            for group_id in owned_group_ids():
                 group_str = str(group_id)
                 
                 if group_str in settings and settings[group_str].get('weekly_reports', True):
-                    await send_weekly_report(group_id)
+                    if settings[group_str].get('last_weekly_report') == week_key:
+                        continue
+                    if await send_weekly_report(group_id):
+                        settings[group_str]['last_weekly_report'] = week_key
+                        sent.append(group_id)
+            
+            if sent:
+                await save_settings(*sent)
                     
     except Exception as e:
         logger.error(f"خطأ في إرسال التقارير الأسبوعية: {e}")
 
-async def send_weekly_report(group_id: int):
+async def send_weekly_report(group_id: int) -> bool:
     """إرسال تقرير أسبوعي"""
     try:
         group_str = str(group_id)
         group_stats = bot_stats['groups'].get(group_str, {})
         group_settings = settings.get(group_str, {})
         
+        # الأسبوع الماضي والأسبوع الذي قبله من السلاسل الزمنية
+        now = time.time()
+        # النافذتان أيام كاملة بالدقة اليومية نفسها حتى لا يظهر فرق وهمي بين الدقتين
+        last_full_day = now - now % 86400 - 1
+        week = stats_series.totals(group_str, 7 * 86400, last_full_day, horizon=14 * 86400)
+        previous_week = stats_series.totals(group_str, 7 * 86400, last_full_day, offset=7 * 86400)
+        
         report = f"""📈 <b>التقرير الأسبوعي - الحارس الأمني</b> {get_random_emoji()}
 
 📅 الفترة: الأسبوع الماضي
-📌 المجموعة: {(await bot.get_chat(group_id)).title}
+📌 المجموعة: {await get_chat_title(group_id)}
 
 📊 <b>إحصائيات الأسبوع:</b>
-• 📨 الرسائل المفحوصة: {format_number(group_stats.get('messages_checked', 0))}
-• ⚠️ المخالفات المكتشفة: {group_stats.get('violations', 0)}
-• 🚫 حالات الحظر: {group_stats.get('bans', 0)}
-• 🔇 حالات الكتم: {group_stats.get('mutes', 0)}
-• 👥 أعضاء جدد: {len(group_stats.get('active_users', set()))}
-
-🏆 <b>الأعضاء الأكثر نشاطاً:</b>"""
-        
-        # إضافة الأعضاء النشطين
-        active_users = list(group_stats.get('active_users', set()))[:3]
-        if active_users:
-            for i, user_id in enumerate(active_users, 1):
-                try:
-                    user = await bot.get_chat_member(group_id, user_id)
-                    name = user.user.full_name[:20]
-                    report += f"\n{i}. {name}"
-                except:
-                    report += f"\n{i}. مستخدم {user_id}"
+• 📨 الرسائل المفحوصة: {format_number(week['messages'])} ({format_trend(week['messages'], previous_week['messages'])})
+• ⚠️ المخالفات المكتشفة: {week['violations']} ({format_trend(week['violations'], previous_week['violations'])})
+• 🚫 حالات الحظر: {week['bans']}
+• 🔇 حالات الكتم: {week['mutes']}
+• ⚠️ التحذيرات: {week['warnings']}
+• 👥 الأعضاء النشطين: {get_active_users_count(group_stats, 'weekly')}"""
         
         report += f"""
 
@@ -2779,10 +4915,13 @@ async def send_weekly_report(group_id: int):
 🛡️ <b>استمر في الحماية!</b>
 المجموعة محمية بواسطة الحارس الأمني المتقدم"""
         
-        await bot.send_message(group_id, report)
+        with outbound_priority(OutboundPriority.REPORT):
+            await bot.send_message(group_id, report)
+        return True
         
     except Exception as e:
         logger.error(f"خطأ في إرسال التقرير الأسبوعي: {e}")
+        return False
 
 async def update_stats_task():
     """مهمة تحديث الإحصائيات"""
@@ -2796,12 +4935,17 @@ async def cleanup_old_data():
     try:
         current_time = time.time()
         
+        # حالات FSM المتروكة
+        purged = await storage.purge()
+        if purged:
+            logger.info(f"تم حذف {purged} حالة FSM منتهية")
+        
         for group_str in settings:
             # تنظيف التحذيرات القديمة (أقدم من شهر)
             if 'warnings' in settings[group_str]:
                 old_warnings = []
                 for user_id, warn_time in list(settings[group_str]['warnings'].items()):
-                    if current_time - warn_time > 2592000:  # 30 يوم
+                    if current_time - warn_time > WARNING_EXPIRY:
                         old_warnings.append(user_id)
                 
                 for user_id in old_warnings:
@@ -2814,6 +4958,12 @@ async def cleanup_old_data():
                     if current_time - app.get('timestamp', 0) < 604800
                 ]
         
+        # تقليص سجلات العد الدقيق للأعضاء النشطين
+        for group_stats in bot_stats['groups'].values():
+            tracker = group_stats.get('active_users')
+            if tracker:
+                tracker.trim(current_time)
+        
         # تنظيف إحصائيات المستخدمين القدامى
         old_users = []
         for user_id, user_data in list(bot_stats['users'].items()):
@@ -2840,32 +4990,257 @@ app = FastAPI(
 WEBHOOK_PATH = f"/bot/{TOKEN}"
 WEBHOOK_URL = f"https://{os.getenv('RENDER_EXTERNAL_HOSTNAME', 'localhost')}{WEBHOOK_PATH}"
 
+# ================== طابور التحديثات ==================
+UPDATE_QUEUE_SIZE = int(os.getenv("UPDATE_QUEUE_SIZE", 1000))  # السعة الإجمالية لكل الأجزاء
+UPDATE_WORKERS = int(os.getenv("UPDATE_WORKERS", 8))  # عدد الأجزاء (عامل واحد لكل جزء)
+UPDATE_OVERLOAD_POLICY = os.getenv("UPDATE_OVERLOAD_POLICY", "reject")  # reject | drop_oldest
+UPDATE_DRAIN_TIMEOUT = 10  # ثوانٍ لإنهاء الطابور عند الإيقاف
+
+update_processing_duration = metrics.register(MetricHistogram(
+    "bot_update_processing_seconds", "Time spent processing an update in a worker"))
+update_end_to_end_lag = metrics.register(MetricHistogram(
+    "bot_update_end_to_end_seconds", "Time from the event date to the end of processing",
+    buckets=(0.5, 1, 2, 5, 10, 30, 60, 300)))
+update_queue_wait = metrics.register(MetricHistogram(
+    "bot_update_queue_wait_seconds", "Time updates waited in the queue"))
+updates_dropped = metrics.register(MetricCounter(
+    "bot_updates_dropped_total", "Updates rejected or dropped by the overload policy", ("reason",)))
+shard_busy_seconds = metrics.register(MetricCounter(
+    "bot_update_shard_busy_seconds_total", "Time each shard worker spent processing", ("shard",)))
+
+def update_chat_id(update: types.Update) -> Optional[int]:
+    """معرف المحادثة التي ينتمي لها التحديث"""
+    event = update.event
+    chat = getattr(event, 'chat', None)
+    if chat is None and isinstance(event, CallbackQuery) and event.message is not None:
+        chat = event.message.chat
+    if chat is not None:
+        return chat.id
+    user = getattr(event, 'from_user', None)
+    return user.id if user is not None else None
+
+class UpdateQueue:
+    """أجزاء مرتبة حسب المحادثة: تحديثات نفس المحادثة بالترتيب والمحادثات المختلفة بالتوازي"""
+    # كل جزء يخدم عدة محادثات بعامل واحد، لذلك لا تنتظر معالجات المجموعات حد الرسائل
+    # لكل محادثة (20/دقيقة)؛ الإشعارات والردود تُرسل عبر spawn_background أو ViolationNotifier
+    
+    def __init__(self, maxsize: int, shards: int, policy: str):
+        self.shard_count = max(1, shards)
+        self.shard_size = max(1, maxsize // self.shard_count)
+        self.policy = policy
+        self.queues: List[asyncio.Queue] = []
+        self.workers: List[asyncio.Task] = []
+    
+    def start(self):
+        """تشغيل عامل لكل جزء"""
+        if self.queues:
+            return
+        self.queues = [asyncio.Queue(maxsize=self.shard_size) for _ in range(self.shard_count)]
+        self.workers = [asyncio.create_task(self._worker(shard)) for shard in range(self.shard_count)]
+    
+    def shard_for(self, update: types.Update) -> int:
+        chat_id = update_chat_id(update)
+        key = chat_id if chat_id is not None else update.update_id
+        return hash64(key & HASH_MASK_64) % self.shard_count
+    
+    def put(self, update: types.Update) -> bool:
+        """إضافة تحديث لجزء محادثته، وإرجاع False إذا رُفض بسبب الضغط"""
+        if not self.queues:
+            self.start()
+        
+        # امتلاء جزء محادثة نشطة لا يؤثر على الأجزاء الأخرى
+        queue = self.queues[self.shard_for(update)]
+        if queue.full():
+            if self.policy == 'drop_oldest':
+                queue.get_nowait()
+                queue.task_done()
+                updates_dropped.inc(labels=("drop_oldest",))
+                logger.warning("جزء من طابور التحديثات ممتلئ، تم إسقاط أقدم تحديث")
+            else:
+                updates_dropped.inc(labels=("rejected",))
+                return False
+        
+        queue.put_nowait((time.perf_counter(), update))
+        return True
+    
+    async def _worker(self, shard: int):
+        queue = self.queues[shard]
+        label = (str(shard),)
+        while True:
+            enqueued, update = await queue.get()
+            started = time.perf_counter()
+            update_queue_wait.observe(started - enqueued)
+            try:
+                await dp.feed_update(bot=bot, update=update)
+            except Exception as e:
+                logger.error(f"❌ خطأ في معالجة التحديث {update.update_id}: {e}")
+            finally:
+                elapsed = time.perf_counter() - started
+                update_processing_duration.observe(elapsed)
+                shard_busy_seconds.inc(elapsed, label)
+                event_date = getattr(update.event, 'date', None)
+                if isinstance(event_date, datetime):
+                    update_end_to_end_lag.observe(max(0.0, time.time() - event_date.timestamp()))
+                queue.task_done()
+    
+    async def stop(self):
+        """انتظار انتهاء التحديثات المعلقة ثم إيقاف العمال"""
+        if not self.queues:
+            return
+        try:
+            await asyncio.wait_for(asyncio.gather(*(q.join() for q in self.queues)), UPDATE_DRAIN_TIMEOUT)
+        except asyncio.TimeoutError:
+            logger.warning(f"انتهت مهلة تفريغ الطابور، {self.depth()} تحديث لم يعالج")
+        for worker in self.workers:
+            worker.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+    
+    def depth(self) -> int:
+        return sum(q.qsize() for q in self.queues)
+    
+    def shard_depths(self) -> Dict[Tuple, float]:
+        return {(str(shard),): q.qsize() for shard, q in enumerate(self.queues)}
+    
+    def shard_lags(self) -> Dict[Tuple, float]:
+        """عمر أقدم تحديث منتظر في كل جزء"""
+        now = time.perf_counter()
+        # _queue هو deque الداخلي لـ asyncio.Queue، والقراءة فقط
+        return {
+            (str(shard),): now - q._queue[0][0] if q.qsize() else 0
+            for shard, q in enumerate(self.queues)
+        }
+
+update_queue = UpdateQueue(UPDATE_QUEUE_SIZE, UPDATE_WORKERS, UPDATE_OVERLOAD_POLICY)
+queue_depth.add_function(lambda: {("updates",): update_queue.depth()})
+update_shard_depth = metrics.register(MetricGauge(
+    "bot_update_shard_depth", "Updates waiting in each shard", ("shard",), function=update_queue.shard_depths))
+update_shard_lag = metrics.register(MetricGauge(
+    "bot_update_shard_lag_seconds", "Age of the oldest waiting update in each shard", ("shard",),
+    function=update_queue.shard_lags))
+
+# ================== الفلترة المسبقة للتحديثات ==================
+# أنواع التحديثات التي تحتوي رسالة
+MESSAGE_UPDATE_KEYS = ('message', 'edited_message')
+
+updates_filtered = metrics.register(MetricCounter(
+    "bot_updates_filtered_total", "Updates dropped before model validation", ("reason",)))
+
+decode_update_json = orjson.loads if orjson is not None else json.loads
+used_update_types: Set[str] = set()
+
+def prefilter_update(data: Dict[str, Any]) -> Optional[str]:
+    """فحص سريع للتحديث الخام قبل بناء النموذج، ويعيد سبب التجاهل إن وجد"""
+    if not isinstance(data, dict) or 'update_id' not in data:
+        return "malformed"
+    
+    update_type = next((key for key in data if key != 'update_id'), None)
+    if used_update_types and update_type not in used_update_types:
+        return "unused_type"
+    
+    if update_type in MESSAGE_UPDATE_KEYS:
+        message = data[update_type]
+        if not isinstance(message, dict):
+            return "malformed"
+        sender = message.get('from', {})
+        chat = message.get('chat', {})
+        if not isinstance(sender, dict) or not isinstance(chat, dict):
+            return "malformed"
+        
+        if sender.get('is_bot'):
+            return "bot_message"
+        
+        if chat.get('type') in ('group', 'supergroup') and chat.get('id') not in ALLOWED_GROUP_IDS:
+            # في المجموعات غير المسجلة تهمنا الأوامر فقط (رد "غير مسجلة")
+            text = message.get('text') or message.get('caption') or ''
+            if not isinstance(text, str) or not text.startswith('/'):
+                return "unregistered_chat"
+    
+    return None
+
+# ================== منع تكرار التحديثات ==================
+UPDATE_DEDUP_SIZE = int(os.getenv("UPDATE_DEDUP_SIZE", 10000))
+
+updates_duplicate = metrics.register(MetricCounter(
+    "bot_updates_duplicate_total", "Redelivered updates skipped by update_id"))
+
+class UpdateDeduplicator:
+    """ذاكرة محدودة لآخر معرفات التحديثات لتجاهل إعادة الإرسال"""
+    
+    def __init__(self, maxsize: int):
+        self.order: deque = deque()
+        self.ids: Set[int] = set()
+        self.maxsize = maxsize
+    
+    def seen(self, update_id: int) -> bool:
+        return update_id in self.ids
+    
+    def add(self, update_id: int):
+        if update_id in self.ids:
+            return
+        if len(self.order) >= self.maxsize:
+            self.ids.discard(self.order.popleft())
+        self.order.append(update_id)
+        self.ids.add(update_id)
+    
+    def __len__(self) -> int:
+        return len(self.ids)
+
+update_dedup = UpdateDeduplicator(UPDATE_DEDUP_SIZE)
+
 @app.on_event("startup")
-async def on_startup():
-    """بدء تشغيل البوت"""
+async def on_startup(transport: str = "webhook"):
+    """بدء تشغيل البوت (webhook | polling | cluster)"""
     logger.info(f"🚀 بدء تشغيل الحارس الأمني المتقدم v{VERSION}")
     
     try:
-        # حذف Webhook القديم
-        await bot.delete_webhook(drop_pending_updates=True)
-        
-        # تعيين Webhook جديد
-        await bot.set_webhook(
-            url=WEBHOOK_URL,
-            drop_pending_updates=True,
-            allowed_updates=dp.resolve_used_update_types()
-        )
+        used_update_types.update(dp.resolve_used_update_types())
+        
+        if cluster_router is not None:
+            # العملية الأمامية: استقبال وتوجيه فقط، والحالة لدى العمال
+            cluster_router.start()
+            await bot.delete_webhook(drop_pending_updates=True)
+            await bot.set_webhook(
+                url=WEBHOOK_URL,
+                drop_pending_updates=True,
+                allowed_updates=sorted(used_update_types)
+            )
+            logger.info(f"✅ تم تعيين Webhook: {WEBHOOK_URL} ({cluster_router.count} عامل)")
+            return
         
-        logger.info(f"✅ تم تعيين Webhook: {WEBHOOK_URL}")
+        if transport == "webhook":
+            # حذف Webhook القديم
+            await bot.delete_webhook(drop_pending_updates=True)
+            
+            # تعيين Webhook جديد
+            await bot.set_webhook(
+                url=WEBHOOK_URL,
+                drop_pending_updates=True,
+                allowed_updates=sorted(used_update_types)
+            )
+            
+            logger.info(f"✅ تم تعيين Webhook: {WEBHOOK_URL}")
+        elif transport == "polling":
+            # getUpdates لا يعمل مع وجود Webhook
+            await bot.delete_webhook(drop_pending_updates=False)
+            logger.info("✅ وضع الاستطلاع (Long Polling)")
+        else:
+            logger.info(f"✅ عامل {cluster_shard[0] + 1}/{cluster_shard[1]}: {len(owned_group_ids())} مجموعة")
         
         # تحميل الإعدادات
         await load_settings()
+        await delayed_actions.restore()
         
         # بدء المهام الخلفية
-        asyncio.create_task(background_tasks())
+        system_sampler.sample()
+        spawn_background(system_sampler.run(), "مراقبة الموارد")
+        spawn_background(background_tasks(), "المهام الخلفية")
+        await broadcast_engine.resume()
+        
+        # عمال طابور التحديثات
+        update_queue.start()
         
-        # إرسال رسالة بدء التشغيل للمطور
-        if DEVELOPER_ID:
+        # إرسال رسالة بدء التشغيل للمطور (مرة واحدة في وضع العمليات المتعددة)
+        if DEVELOPER_ID and (cluster_shard is None or cluster_shard[0] == 0):
             try:
                 await bot.send_message(
                     DEVELOPER_ID,
@@ -2873,7 +5248,7 @@ async def on_startup():
                     f"⏰ الوقت: {get_formatted_time()}\n"
                     f"🚀 الإصدار: {VERSION}\n"
                     f"📊 المجموعات: {len(ALLOWED_GROUP_IDS)}\n"
-                    f"🔗 Webhook: {WEBHOOK_URL}\n\n"
+                    f"🔗 الاستقبال: {WEBHOOK_URL if transport == 'webhook' else transport}\n\n"
                     f"{get_random_emoji()} البوت يعمل بكفاءة عالية!"
                 )
             except:
@@ -2889,9 +5264,14 @@ async def on_shutdown():
     """إيقاف تشغيل البوت"""
     logger.info("🛑 إيقاف تشغيل البوت...")
     
+    if cluster_router is not None:
+        await cluster_router.stop()
+        await bot.session.close()
+        return
+    
     try:
         # إرسال رسالة إيقاف التشغيل للمطور
-        if DEVELOPER_ID:
+        if DEVELOPER_ID and (cluster_shard is None or cluster_shard[0] == 0):
             try:
                 await bot.send_message(
                     DEVELOPER_ID,
@@ -2906,12 +5286,20 @@ async def on_shutdown():
             except:
                 pass
         
+        # إنهاء التحديثات المعلقة
+        await update_queue.stop()
+        
+        # تنفيذ عمليات الحذف المعلقة
+        await deletion_batcher.flush_all()
+        
         # حفظ الإعدادات النهائية
         await save_settings()
         await save_stats()
         
         # إغلاق الجلسة
         await bot.session.close()
+        await storage.close()
+        await delayed_actions.close()
         
         logger.info("✅ تم إيقاف البوت بنجاح")
         
@@ -2921,14 +5309,34 @@ async def on_shutdown():
 @app.post(WEBHOOK_PATH)
 async def bot_webhook(request: Request):
     """معالج Webhook"""
+    started = time.perf_counter()
     try:
-        update_data = await request.json()
+        update_data = decode_update_json(await request.body())
+        reason = prefilter_update(update_data)
+        if reason is not None:
+            updates_filtered.inc(labels=(reason,))
+            return {"status": "ok"}
+        if update_dedup.seen(update_data['update_id']):
+            updates_duplicate.inc()
+            return {"status": "ok"}
+        if cluster_router is not None:
+            # التحقق من النموذج يتم في العامل المالك للمحادثة
+            if not cluster_router.route(update_data, await cluster_route_key(update_data)):
+                return Response(status_code=503)
+            update_dedup.add(update_data['update_id'])
+            return {"status": "ok"}
         update = types.Update.model_validate(update_data)
-        await dp.feed_update(bot=bot, update=update)
+        if not update_queue.put(update):
+            # Telegram يعيد إرسال التحديث لاحقاً عند رد غير ناجح
+            return Response(status_code=503)
+        # التسجيل بعد القبول فقط، حتى لا يُتجاهل تحديث رُفض بسبب الضغط
+        update_dedup.add(update.update_id)
         return {"status": "ok"}
     except Exception as e:
         logger.error(f"❌ خطأ في Webhook: {e}")
         return {"status": "error", "message": str(e)}
+    finally:
+        webhook_duration.observe(time.perf_counter() - started)
 
 @app.get("/")
 async def root():
@@ -2959,19 +5367,49 @@ async def root():
 @app.get("/health")
 async def health_check():
     """فحص صحة البوت"""
+    system = system_sampler.latest()
     return {
         "status": "healthy",
         "timestamp": datetime.now().isoformat(),
-        "memory_usage_mb": bot_stats['system']['memory_usage'],
-        "cpu_usage_percent": bot_stats['system']['cpu_usage'],
-        "response_time_ms": 0.1
+        "memory_usage_mb": system['memory_mb'],
+        "cpu_usage_percent": system['cpu_percent'],
+        "process_cpu_percent": system['process_cpu_percent'],
+        "event_loop_lag_ms": system['loop_lag_ms'],
+        "open_fds": system['open_fds'],
+        "sample_age_seconds": round(time.time() - system['timestamp'], 1) if system['timestamp'] else None,
+        "response_time_ms": round(webhook_duration.mean() * 1000, 2) if webhook_duration.mean() is not None else None
     }
 
+@app.get("/metrics")
+async def metrics_endpoint():
+    """مقاييس الأداء بصيغة Prometheus"""
+    # في وضع العمليات المتعددة تعرض العملية الأمامية مقاييس الاستقبال والتوجيه فقط؛
+    # إحصائيات المعالجة المجمعة من العمال متاحة عبر /cluster
+    return Response(content=metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/cluster")
+async def cluster_status():
+    """حالة العمال والإحصائيات المجمعة في وضع العمليات المتعددة"""
+    if cluster_router is None:
+        raise HTTPException(status_code=404, detail="Cluster mode is not enabled")
+    return cluster_router.aggregate()
+
 @app.get("/stats/api")
 async def api_stats():
     """إحصائيات API"""
+    if cluster_router is not None:
+        # العملية الأمامية لا تعالج التحديثات، فالإحصائيات عند العمال
+        return {"bot_statistics": cluster_router.aggregate()}
+    
+    statistics = dict(bot_stats)
+    statistics['groups'] = {
+        group_str: serialize_group_stats(group_stats)
+        for group_str, group_stats in bot_stats['groups'].items()
+    }
+    statistics['active_users'] = {window: global_active_users(window) for window in ACTIVE_USER_WINDOWS}
+    
     return {
-        "bot_statistics": bot_stats,
+        "bot_statistics": statistics,
         "settings": {
             "total_groups": len(settings),
             "groups": list(settings.keys())
@@ -2984,29 +5422,451 @@ async def api_stats():
     }
 
 @app.get("/backup/{group_id}")
-async def backup_endpoint(group_id: int):
+async def backup_endpoint(group_id: int, incremental: bool = False):
     """إنشاء نسخة احتياطية عبر API"""
+    if cluster_router is not None:
+        # الإعدادات عند العمال، والعملية الأمامية لا تملك نسخة منها
+        raise HTTPException(status_code=503, detail="Backups are not available on the cluster front process")
+    
     try:
         if group_id not in ALLOWED_GROUP_IDS:
             raise HTTPException(status_code=403, detail="Group not allowed")
         
-        success = await create_backup(group_id, manual=True)
+        changed = group_changed_since_backup(str(group_id))
+        success = await create_backup(group_id, manual=True, incremental=incremental)
         
         if success:
             return {
                 "status": "success",
-                "message": "Backup created successfully",
+                "message": "Backup created successfully" if changed or not incremental else "No changes since last backup",
                 "group_id": group_id,
+                "incremental": incremental,
                 "timestamp": time.time()
             }
         else:
             raise HTTPException(status_code=500, detail="Failed to create backup")
             
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/restore")
+async def restore_endpoint(request: Request, group_id: Optional[int] = None):
+    """استعادة الإعدادات عبر API (تدفق ملف النسخة في جسم الطلب)"""
+    if not RESTORE_API_KEY or request.headers.get("X-API-Key") != RESTORE_API_KEY:
+        raise HTTPException(status_code=403, detail="Restore API disabled or unauthorized")
+    
+    if cluster_router is not None:
+        raise HTTPException(status_code=503, detail="Restore is not available on the cluster front process")
+    
+    if group_id is not None and group_id not in ALLOWED_GROUP_IDS:
+        raise HTTPException(status_code=403, detail="Group not allowed")
+    
+    try:
+        summary = await restore_from_stream(
+            request.stream(),
+            {group_id} if group_id is not None else None
+        )
+    except (ValueError, zlib.error) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid backup: {e}")
+    
+    return {
+        "status": "success" if summary['restored'] else "nothing_restored",
+        "restored": summary['restored'],
+        "invalid": summary['invalid'],
+        "skipped": summary['skipped'],
+        "timestamp": time.time()
+    }
+
+# ================== وضع الاستطلاع ==================
+POLLING_BATCH_SIZE = int(os.getenv("POLLING_BATCH_SIZE", 100))  # حد getUpdates
+POLLING_TIMEOUT = int(os.getenv("POLLING_TIMEOUT", 25))  # ثوانٍ للاستطلاع الطويل
+POLLING_ERROR_DELAY = 5
+POLLING_BACKPRESSURE_DELAY = 0.1
+
+polling_batch_size = metrics.register(MetricHistogram(
+    "bot_polling_batch_size", "Updates returned by each getUpdates call",
+    buckets=(0, 1, 5, 10, 25, 50, 100)))
+
+class GetRawUpdates(GetUpdates):
+    """getUpdates بدون بناء نماذج Update، لتمر التحديثات بالفلترة المسبقة كما في Webhook"""
+    __returning__ = List[Dict[str, Any]]
+
+async def run_polling():
+    """تشغيل البوت عبر getUpdates بدون عنوان عام، بنفس طابور المعالجة"""
+    await on_startup("polling")
+    offset = None
+    try:
+        while True:
+            try:
+                updates = await bot(GetRawUpdates(
+                    offset=offset,
+                    limit=POLLING_BATCH_SIZE,
+                    timeout=POLLING_TIMEOUT,
+                    allowed_updates=sorted(used_update_types)
+                ), request_timeout=POLLING_TIMEOUT + 10)
+            except Exception as e:
+                logger.error(f"❌ خطأ في جلب التحديثات: {e}")
+                await asyncio.sleep(POLLING_ERROR_DELAY)
+                continue
+            
+            polling_batch_size.observe(len(updates))
+            for update_data in updates:
+                try:
+                    reason = prefilter_update(update_data)
+                except Exception as e:
+                    logger.error(f"❌ خطأ في فلترة التحديث: {e}")
+                    reason = "malformed"
+                if reason is not None:
+                    updates_filtered.inc(labels=(reason,))
+                elif update_dedup.seen(update_data['update_id']):
+                    updates_duplicate.inc()
+                else:
+                    try:
+                        update = types.Update.model_validate(update_data)
+                    except Exception as e:
+                        logger.error(f"❌ تحديث غير صالح {update_data['update_id']}: {e}")
+                    else:
+                        # التحديثات محفوظة لدى Telegram، لذلك ننتظر بدل الرفض
+                        while not update_queue.put(update):
+                            await asyncio.sleep(POLLING_BACKPRESSURE_DELAY)
+                        update_dedup.add(update.update_id)
+                # تقديم الإزاحة بعد قبول التحديث فقط
+                if isinstance(update_data, dict) and 'update_id' in update_data:
+                    offset = update_data['update_id'] + 1
+    finally:
+        await on_shutdown()
+
+# ================== النشر متعدد العمليات ==================
+CLUSTER_WORKERS = int(os.getenv("CLUSTER_WORKERS", os.cpu_count() or 1))
+CLUSTER_STATS_INTERVAL = 30  # ثوانٍ بين إرسال إحصائيات العمال
+CLUSTER_STOP_TIMEOUT = 15
+
+cluster_shard: Optional[Tuple[int, int]] = None  # (رقم العامل، عدد العمال) داخل عملية عاملة
+cluster_router = None  # موجه التحديثات في العملية الأمامية
+
+def shard_of(key: int, count: int) -> int:
+    """رقم العامل المالك لمعرف محادثة"""
+    return hash64(key & HASH_MASK_64) % count
+
+def owned_group_ids() -> List[int]:
+    """المجموعات التي تملك هذه العملية حالتها"""
+    if cluster_shard is None:
+        return ALLOWED_GROUP_IDS
+    index, count = cluster_shard
+    return [gid for gid in ALLOWED_GROUP_IDS if shard_of(gid, count) == index]
+
+def raw_update_chat_id(data: Dict[str, Any]) -> Optional[int]:
+    """معرف المحادثة من التحديث الخام (مثل update_chat_id بدون بناء النموذج)"""
+    event = next((value for key, value in data.items() if key != 'update_id'), None)
+    if not isinstance(event, dict):
+        return None
+    chat = event.get('chat') or (event.get('message') or {}).get('chat')
+    if chat:
+        return chat.get('id')
+    return (event.get('from') or {}).get('id')
+
+def callback_group_id(data: str) -> Optional[int]:
+    """المجموعة المستهدفة في بيانات زر (الصيغة الجديدة أو القديمة)"""
+    route = callback_router.resolve(data)
+    return getattr(route[1], 'group_id', None) if route else None
+
+async def cluster_route_key(data: Dict[str, Any]) -> int:
+    """مفتاح التوجيه: المجموعة التي يستهدفها التحديث إن عُرفت، وإلا المحادثة"""
+    # أزرار لوحات التحكم تصل من المحادثة الخاصة لكنها تخص مجموعة يملكها عامل آخر
+    callback = data.get('callback_query')
+    if isinstance(callback, dict) and callback.get('data'):
+        group_id = callback_group_id(callback['data'])
+        if group_id is not None:
+            return group_id
+    
+    # ردود الخاص أثناء حالة FSM (مثل إضافة كلمة) تذهب لمالك المجموعة المحفوظة في الحالة
+    message = data.get('message')
+    if isinstance(message, dict) and (message.get('chat') or {}).get('type') == 'private' and message.get('from'):
+        key = StorageKey(bot_id=bot.id, chat_id=message['chat']['id'], user_id=message['from']['id'])
+        group_id = (await storage.get_data(key)).get('group_id')
+        if isinstance(group_id, int):
+            return group_id
+    
+    chat_id = raw_update_chat_id(data)
+    return chat_id if chat_id is not None else data['update_id']
+
+class ClusterRouter:
+    """توجيه التحديثات الخام لعمليات عاملة حسب المحادثة وجمع إحصائياتها"""
+    
+    def __init__(self, count: int):
+        self.count = count
+        self.context = multiprocessing.get_context("spawn")
+        self.queues = [self.context.Queue(maxsize=UPDATE_QUEUE_SIZE) for _ in range(count)]
+        self.stats_queue = self.context.Queue()
+        self.processes = []
+        self.worker_stats: Dict[int, Dict[str, Any]] = {}
+        self._collector: Optional[asyncio.Task] = None
+    
+    def start(self):
+        for index in range(self.count):
+            process = self.context.Process(
+                target=cluster_worker_main,
+                args=(index, self.count, self.queues[index], self.stats_queue),
+                name=f"bot-worker-{index}",
+                daemon=True
+            )
+            process.start()
+            self.processes.append(process)
+        self._collector = asyncio.create_task(self._collect())
+    
+    def route(self, data: Dict[str, Any], key: int) -> bool:
+        """إرسال التحديث للعامل المالك لمفتاح التوجيه، وإرجاع False عند امتلاء طابوره"""
+        index = shard_of(key, self.count)
+        try:
+            self.queues[index].put_nowait(data)
+            return True
+        except queue.Full:
+            updates_dropped.inc(labels=("rejected",))
+            return False
+    
+    async def _collect(self):
+        while True:
+            try:
+                while True:
+                    snapshot = self.stats_queue.get_nowait()
+                    self.worker_stats[snapshot['shard']] = snapshot
+            except queue.Empty:
+                pass
+            await asyncio.sleep(1)
+    
+    def aggregate(self) -> Dict[str, Any]:
+        """مجموع إحصائيات كل العمال (كل مجموعة يملكها عامل واحد، فلا تتداخل)"""
+        totals = Counter()
+        commands_used = Counter()
+        groups = {}
+        users = 0
+        for snapshot in self.worker_stats.values():
+            totals.update(snapshot['totals'])
+            commands_used.update(snapshot['commands_used'])
+            groups.update(snapshot['groups_stats'])
+            users += snapshot['users']
+        return {
+            'workers': self.count,
+            'alive': sum(1 for p in self.processes if p.is_alive()),
+            'totals': dict(totals),
+            'commands_used': dict(commands_used),
+            # الأعضاء قد يتكررون بين العمال، فهذا حد أعلى
+            'users': users,
+            'groups': groups,
+            'per_worker': {
+                index: {
+                    'pid': snapshot['pid'],
+                    'groups': snapshot['groups'],
+                    'queue_depth': snapshot['queue_depth'],
+                    'age_seconds': round(time.time() - snapshot['timestamp'], 1)
+                }
+                for index, snapshot in sorted(self.worker_stats.items())
+            }
+        }
+    
+    async def stop(self):
+        if self._collector is not None:
+            self._collector.cancel()
+        for q in self.queues:
+            with contextlib.suppress(Exception):
+                q.put_nowait(None)
+        for process in self.processes:
+            await asyncio.to_thread(process.join, CLUSTER_STOP_TIMEOUT)
+            if process.is_alive():
+                process.terminate()
+
+def cluster_worker_main(index: int, count: int, updates, stats_out):
+    """نقطة دخول العملية العاملة"""
+    global cluster_shard
+    cluster_shard = (index, count)
+    # كل العمال يرسلون بالتوكن نفسه، فيأخذ كل عامل حصته من الحد العام
+    outbound_scheduler.global_bucket = TokenBucket(
+        OUTBOUND_GLOBAL_RATE / count, max(1.0, OUTBOUND_GLOBAL_BURST / count))
+    broadcast_engine.state_file = f"{BROADCAST_STATE_FILE}.{index}"
+    try:
+        asyncio.run(run_cluster_worker(updates, stats_out))
+    except KeyboardInterrupt:
+        pass
+
+async def push_cluster_stats(stats_out):
+    """إرسال ملخص إحصائيات العامل للعملية الأمامية"""
+    while True:
+        with contextlib.suppress(Exception):
+            stats_out.put_nowait({
+                'shard': cluster_shard[0],
+                'pid': os.getpid(),
+                'groups': len(owned_group_ids()),
+                'queue_depth': update_queue.depth(),
+                'totals': {k: v for k, v in bot_stats.items() if k.startswith('total_')},
+                'commands_used': dict(bot_stats['commands_used']),
+                'users': len(bot_stats['users']),
+                'groups_stats': {
+                    group_str: serialize_group_stats(group_stats)
+                    for group_str, group_stats in bot_stats['groups'].items()
+                },
+                'timestamp': time.time()
+            })
+        await asyncio.sleep(CLUSTER_STATS_INTERVAL)
+
+async def run_cluster_worker(updates, stats_out):
+    """معالجة التحديثات الموجهة لهذا العامل"""
+    await on_startup("cluster")
+    reporter = asyncio.create_task(push_cluster_stats(stats_out))
+    try:
+        while True:
+            data = await asyncio.to_thread(updates.get)
+            if data is None:
+                break
+            try:
+                update = types.Update.model_validate(data)
+            except Exception as e:
+                logger.error(f"❌ تحديث غير صالح {data.get('update_id')}: {e}")
+                continue
+            while not update_queue.put(update):
+                await asyncio.sleep(POLLING_BACKPRESSURE_DELAY)
+    finally:
+        reporter.cancel()
+        await on_shutdown()
+
+# ================== قياس أداء جلسة HTTP ==================
+BENCH_REQUESTS = int(os.getenv("BENCH_REQUESTS", 2000))
+BENCH_CONCURRENCY = int(os.getenv("BENCH_CONCURRENCY", 50))
+BENCH_STUB_LATENCY = float(os.getenv("BENCH_STUB_LATENCY", 0.005))
+
+# إعدادات الجلسة المقارنة: الاسم -> معاملات TunedAiohttpSession
+BENCH_PROFILES = {
+    'default': {},
+    'no_keepalive': {'keepalive_timeout': 0},
+    'pool_10': {'limit': 10},
+    'pool_1': {'limit': 1},
+    'per_host_20': {'limit_per_host': 20},
+}
+
+async def start_stub_bot_api(latency: float):
+    """خادم Bot API وهمي محلي يرد على sendMessage"""
+    from aiohttp import web
+    
+    async def handle(request: web.Request):
+        await asyncio.sleep(latency)
+        data = await request.post()
+        return web.json_response({
+            "ok": True,
+            "result": {
+                "message_id": 1,
+                "date": int(time.time()),
+                "chat": {"id": int(data.get("chat_id", 1)), "type": "group", "title": "bench"},
+                "text": data.get("text", "")
+            }
+        })
+    
+    app_stub = web.Application()
+    app_stub.router.add_post("/bot{token}/{method}", handle)
+    runner = web.AppRunner(app_stub, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{port}"
+
+async def bench_profile(base_url: str, options: Dict[str, Any]) -> Dict[str, Any]:
+    """إرسال BENCH_REQUESTS طلب عبر جلسة بالإعدادات المحددة"""
+    session = TunedAiohttpSession(api=TelegramAPIServer.from_base(base_url), **options)
+    bench_bot = Bot(token="1:bench", session=session)
+    semaphore = asyncio.Semaphore(BENCH_CONCURRENCY)
+    latencies = []
+    
+    async def one(i: int):
+        async with semaphore:
+            started = time.perf_counter()
+            await bench_bot.send_message(-1000 - i % 50, "bench")
+            latencies.append(time.perf_counter() - started)
+    
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(BENCH_REQUESTS)))
+    elapsed = time.perf_counter() - started
+    await session.close()
+    
+    latencies.sort()
+    return {
+        'rps': BENCH_REQUESTS / elapsed,
+        'p50_ms': latencies[len(latencies) // 2] * 1000,
+        'p99_ms': latencies[int(len(latencies) * 0.99)] * 1000,
+        'created': session.connection_stats['created'],
+        'reused': session.connection_stats['reused']
+    }
+
+async def run_http_bench():
+    """مقارنة إعدادات الجلسة مقابل خادم وهمي محلي"""
+    runner, base_url = await start_stub_bot_api(BENCH_STUB_LATENCY)
+    try:
+        print(f"{'profile':<14}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'opened':>9}{'reused':>9}")
+        for name, options in BENCH_PROFILES.items():
+            result = await bench_profile(base_url, options)
+            print(f"{name:<14}{result['rps']:>10.0f}{result['p50_ms']:>10.1f}{result['p99_ms']:>10.1f}"
+                  f"{result['created']:>9}{result['reused']:>9}")
+    finally:
+        await runner.cleanup()
+
+# ================== قياس أداء موجه الأزرار ==================
+def callback_bench_samples() -> Dict[str, str]:
+    """بيانات زر نموذجية لكل مسار مسجل (بالصيغة الجديدة والقديمة)"""
+    group_id = ALLOWED_GROUP_IDS[0]
+    samples = {name: name for name in callback_router.exact}
+    samples["dev_logs"] = "dev_logs"
+    for cls, field, routes in callback_router.typed.values():
+        for route in routes:
+            if cls is GroupCallback:
+                packed = GroupCallback(action=route, group_id=group_id).pack()
+                legacy = f"{route}_{group_id}"
+            elif cls is ModeCallback:
+                packed = ModeCallback(mode="mute_then_ban", group_id=group_id).pack()
+                legacy = f"setmode_mute_then_ban_{group_id}"
+            else:
+                packed = ApplicationCallback(action=route, user_id=DEVELOPER_ID, group_id=group_id).pack()
+                legacy = f"{route}_app_{DEVELOPER_ID}_{group_id}"
+            samples[packed] = packed
+            samples[f"legacy {legacy}"] = legacy
+    return samples
+
+def run_callback_bench(iterations: int = 20000):
+    """قياس زمن إيجاد المعالج لكل مسار"""
+    results = []
+    for label, data in callback_bench_samples().items():
+        assert len(data.encode()) <= 64, data
+        assert callback_router.resolve(data) is not None, data
+        started = time.perf_counter()
+        for _ in range(iterations):
+            callback_router.resolve(data)
+        results.append((label, (time.perf_counter() - started) / iterations * 1e9, len(data.encode())))
+    
+    print(f"{'route':<58}{'ns':>8}{'bytes':>7}")
+    for label, ns, size in sorted(results, key=lambda r: r[1]):
+        print(f"{label:<58}{ns:>8.0f}{size:>7}")
+
 # ================== تشغيل البوت ==================
 if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "bench":
+        asyncio.run(run_http_bench())
+        sys.exit(0)
+    
+    if len(sys.argv) > 1 and sys.argv[1] == "bench-callbacks":
+        run_callback_bench()
+        sys.exit(0)
+    
+    if len(sys.argv) > 1 and sys.argv[1] == "cluster":
+        if len(sys.argv) > 2:
+            CLUSTER_WORKERS = int(sys.argv[2])
+        cluster_router = ClusterRouter(CLUSTER_WORKERS)
+    
+    if len(sys.argv) > 1 and sys.argv[1] == "polling":
+        try:
+            asyncio.run(run_polling())
+        except KeyboardInterrupt:
+            pass
+        sys.exit(0)
+    
     import uvicorn
     
     # إعدادات الخادم